@@ -0,0 +1,109 @@
+# ZeroDB.py
+
+import os
+import queue
+import threading
+import logging
+import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from config import DATABASE_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# Most connections one process keeps open; further callers wait for one to be released
+DB_POOL_SIZE = 8
+
+class ConnectionPool:
+    """
+    Thread-safe pool of psycopg2 connections, opened on demand and kept open for reuse.
+    get() blocks while max_size connections are checked out.
+    """
+    def __init__(self, max_size, **connect_kwargs):
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._idle = queue.LifoQueue() # Most recently used first, so spare connections can time out server-side
+        self._connect_kwargs = connect_kwargs
+
+    def get(self):
+        self._slots.acquire()
+        try:
+            while True:
+                try:
+                    conn = self._idle.get_nowait()
+                except queue.Empty:
+                    return psycopg2.connect(**self._connect_kwargs)
+                if not conn.closed:
+                    return conn
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def put(self, conn):
+        try:
+            if not conn.closed:
+                # Don't hand the next caller an open (or aborted) transaction
+                if conn.info.transaction_status != TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                self._idle.put(conn)
+        except psycopg2.Error as e:
+            logger.debug(f"Discarding broken pooled connection: {e}")
+            conn.close()
+        finally:
+            self._slots.release()
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Return this process's connection pool (a forked child gets its own, sockets can't be shared)."""
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool_pid != pid:
+        with _pool_lock:
+            if _pool_pid != pid:
+                _pool = ConnectionPool(DB_POOL_SIZE, **DATABASE_CONFIG)
+                _pool_pid = pid
+    return _pool
+
+def get_db_connection():
+    """Borrow a database connection; give it back with release_db_connection()."""
+    return get_pool().get()
+
+def release_db_connection(conn):
+    """Return a connection from get_db_connection() to the pool (uncommitted work is rolled back)."""
+    get_pool().put(conn)
+
+# Columns scraped_data gained after its first release; tables created by older versions lack them
+MIGRATE_SCRAPED_DATA = """
+    ALTER TABLE IF EXISTS scraped_data
+        ADD COLUMN IF NOT EXISTS content_hash BYTEA,
+        ADD COLUMN IF NOT EXISTS fetched_at TIMESTAMPTZ,
+        ADD COLUMN IF NOT EXISTS summary TEXT,
+        ADD COLUMN IF NOT EXISTS summary_hash BYTEA;
+"""
+
+_schema_migrated = False
+_schema_lock = threading.Lock()
+
+def ensure_schema():
+    """
+    Bring an existing scraped_data table up to date, once per process.
+    Called before the queries that use the newer columns, so they also work on a
+    database that hasn't been re-indexed (ZeroSkan.initDB()) since upgrading.
+    """
+    global _schema_migrated
+    if _schema_migrated:
+        return
+    with _schema_lock:
+        if _schema_migrated:
+            return
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(MIGRATE_SCRAPED_DATA)
+            conn.commit()
+            _schema_migrated = True
+        except psycopg2.Error as e:
+            logger.error(f"Error migrating the scraped_data table: {e}")
+        finally:
+            release_db_connection(conn)
@@ -1,5 +1,7 @@
 #!/usr/bin/env python3
 import logging
+import logging.handlers
+import multiprocessing as mp
 from ZeroMain import ZeroMain
 from ZeroGUI import ZeroGUI
 
@@ -14,12 +16,23 @@ def main():
     gui.run()
 
 if __name__ == "__main__":
+    # Threads only enqueue log records; a listener thread does the file/console writes.
+    # A multiprocessing queue, since the forked scraper processes inherit the handler
+    # and their records have to reach this process's listener
+    log_queue = mp.Queue()
+    formatter = logging.Formatter('%(asctime)s [%(levelname)s] %(message)s')
+    file_handler = logging.FileHandler("zeroweb.log")
+    file_handler.setFormatter(formatter)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(formatter)
+    listener = logging.handlers.QueueListener(log_queue, file_handler, stream_handler)
     logging.basicConfig(
         level=logging.INFO,
-        format='%(asctime)s [%(levelname)s] %(message)s',
-        handlers=[
-            logging.FileHandler("zeroweb.log"),
-            logging.StreamHandler()
-        ]
+        handlers=[logging.handlers.QueueHandler(log_queue)],
+        force=True # The imported modules already called basicConfig
     )
-    main()
\ No newline at end of file
+    listener.start()
+    try:
+        main()
+    finally:
+        listener.stop()
\ No newline at end of file
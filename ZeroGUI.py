@@ -36,6 +36,7 @@ class ZeroGUI:
         self.main_controller.gui_request_domains = self.get_domains_from_gui
         self.main_controller.gui_request_query = self.get_query_from_gui
         self.main_controller.gui_request_ai_mode = self.get_ai_mode_from_gui
+        self.main_controller.gui_request_search_params = self.get_search_params
 
         # Build UI elements
         self.build_index_tab()
@@ -259,6 +260,10 @@ class ZeroGUI:
         """Called by ZeroMain to get the current AI mode setting from the GUI."""
         return self.ai_mode_var.get()
 
+    def get_search_params(self) -> tuple:
+        """Called by ZeroMain to get (query, ai_mode) from the GUI in one call."""
+        return self.query_entry.get().strip(), self.ai_mode_var.get()
+
     def on_closing(self):
         """Handles the window closing event."""
         if messagebox.askokcancel("Quit", "Do you want to quit?"):
@@ -1,12 +1,14 @@
 # ZeroIndex.py
 
+import os
+import math
 import faiss
 import numpy as np
 import pickle
-import psycopg2
 from sentence_transformers import SentenceTransformer
-from config import DATABASE_CONFIG, FAISS_INDEX_PATH, FAISS_INDEX_CONFIG
+from config import FAISS_INDEX_PATH, FAISS_INDEX_CONFIG, USE_GPU_FAISS
 from psycopg2.extras import RealDictCursor
+from ZeroDB import get_db_connection, release_db_connection
 import logging
 
 # Setup logging
@@ -14,8 +16,17 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # FAISS index configuration
-INDEX_FACTORY_STRING = FAISS_INDEX_CONFIG.get("factory", "IVF4096,PQ32x8")
-NPROBE = FAISS_INDEX_CONFIG.get("nprobe", 8)
+INDEX_FACTORY_STRING = FAISS_INDEX_CONFIG.get("factory", "OPQ32,IVF{nlist},PQ32")
+NPROBE = FAISS_INDEX_CONFIG.get("nprobe", 16)
+# Fixed number of IVF lists, or None to derive it from the corpus size (about 4*sqrt(N))
+NLIST = FAISS_INDEX_CONFIG.get("nlist")
+# Corpora up to this size use an exact flat index; IVF/PQ needs enough vectors to train
+FLAT_INDEX_MAX = FAISS_INDEX_CONFIG.get("flat_max", 10000)
+# Upper bound on the vectors used to train the quantizers
+TRAIN_SAMPLE_MAX = FAISS_INDEX_CONFIG.get("train_sample", 100000)
+
+# id -> URL table written next to the index, so searches don't have to load it from the DB
+LABELS_PATH = f"{FAISS_INDEX_PATH}.labels.npz"
 
 # Global variables
 index = None
@@ -29,15 +40,47 @@ def get_model():
         EMBEDDING_MODEL = SentenceTransformer('all-MiniLM-L6-v2')
     return EMBEDDING_MODEL
 
-def get_db_connection():
-    return psycopg2.connect(**DATABASE_CONFIG)
+def encode_embedding(embedding):
+    """Serialize an embedding for the BYTEA column as raw little-endian float32 bytes."""
+    return np.asarray(embedding, dtype='<f4').tobytes()
+
+def decode_embedding(data):
+    """Deserialize a stored embedding, raw float32 bytes or (older rows) a pickled array."""
+    data = bytes(data)
+    if data[:1] == b'\x80' and b'numpy' in data[:64]:
+        return pickle.loads(data)
+    return np.frombuffer(data, dtype='<f4')
 
 def embed_text(text):
     """Generate embedding for a given text."""
     model = get_model()
-    embedding = model.encode(text, convert_to_numpy=True).astype('float32')
+    embedding = model.encode(text, convert_to_numpy=True, normalize_embeddings=True).astype('float32')
     return embedding
 
+def embed_texts(texts, batch_size=128):
+    """Generate unit-length float32 embeddings for a list of texts in one batched encode call."""
+    model = get_model()
+    return model.encode(list(texts), batch_size=batch_size, convert_to_numpy=True,
+                        normalize_embeddings=True).astype('float32')
+
+def save_embeddings_to_db(row_ids, embeddings):
+    """Save a batch of embeddings (one per row id) in a single transaction."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.executemany("""
+            UPDATE scraped_data
+            SET embedding = %s
+            WHERE id = %s
+        """, [(encode_embedding(embedding), row_id) for row_id, embedding in zip(row_ids, embeddings)])
+        conn.commit()
+    except Exception as e:
+        logger.error(f"Error saving embeddings for {len(row_ids)} rows: {e}")
+        conn.rollback()
+    finally:
+        cursor.close()
+        release_db_connection(conn)
+
 def save_embedding_to_db(row_id, embedding):
     """Save embedding to the third column (embedding) of the corresponding row."""
     conn = get_db_connection()
@@ -47,14 +90,14 @@ def save_embedding_to_db(row_id, embedding):
             UPDATE scraped_data
             SET embedding = %s
             WHERE id = %s
-        """, (pickle.dumps(embedding), row_id))
+        """, (encode_embedding(embedding), row_id))
         conn.commit()
     except Exception as e:
         logger.error(f"Error saving embedding for row {row_id}: {e}")
         conn.rollback()
     finally:
         cursor.close()
-        conn.close()
+        release_db_connection(conn)
 
 def load_all_rows():
     """Load all rows from the database with id, url, snippet, embedding."""
@@ -69,7 +112,133 @@ def load_all_rows():
         return []
     finally:
         cursor.close()
-        conn.close()
+        release_db_connection(conn)
+
+def set_nprobe(index, nprobe=NPROBE):
+    """Set nprobe on the IVF part of index (also through an OPQ/ID-map wrapper); no-op for flat indexes."""
+    try:
+        faiss.extract_index_ivf(index).nprobe = nprobe
+    except RuntimeError:
+        pass
+
+def to_gpu_if_enabled(index, nprobe=NPROBE):
+    """
+    Copy index to the visible GPU(s) when USE_GPU_FAISS is set (sharded across all of them),
+    returning the CPU index unchanged otherwise or if that is not possible.
+    """
+    if not USE_GPU_FAISS or index is None:
+        return index
+    try:
+        if faiss.get_num_gpus() == 0:
+            return index
+        options = faiss.GpuMultipleClonerOptions()
+        options.shard = True
+        options.useFloat16 = True # fp16 lookup tables for IVFPQ
+        gpu_index = faiss.index_cpu_to_all_gpus(index, options)
+        # extract_index_ivf() does not see through GPU indexes
+        faiss.GpuParameterSpace().set_index_parameter(gpu_index, "nprobe", nprobe)
+        logger.info(f"FAISS index moved to {faiss.get_num_gpus()} GPU(s)")
+        return gpu_index
+    except (AttributeError, RuntimeError) as e:
+        # CPU-only faiss build, or an index type the GPU cloner can't handle
+        logger.warning(f"Keeping FAISS index on CPU: {e}")
+        return index
+
+class UrlLabels:
+    """
+    Compact, read-only DB id -> URL mapping: the ids sorted in one int64 array and the URLs
+    concatenated in one UTF-8 buffer with offsets, instead of a dict of str objects.
+    """
+    __slots__ = ("ids", "offsets", "blob")
+
+    def __init__(self, ids, offsets, blob):
+        self.ids = ids
+        self.offsets = offsets
+        self.blob = blob
+
+    @classmethod
+    def from_pairs(cls, ids, urls):
+        """Build the table from parallel lists of DB ids and URLs."""
+        ids = np.asarray(ids, dtype='int64')
+        order = np.argsort(ids, kind='stable')
+        encoded = [urls[i].encode('utf-8') for i in order.tolist()]
+        offsets = np.zeros(len(encoded) + 1, dtype='int64')
+        np.cumsum([len(url) for url in encoded], out=offsets[1:])
+        return cls(ids[order], offsets, b"".join(encoded))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _position(self, row_id):
+        pos = int(np.searchsorted(self.ids, row_id))
+        return pos if pos < len(self.ids) and self.ids[pos] == row_id else -1
+
+    def __contains__(self, row_id):
+        return self._position(row_id) >= 0
+
+    def __getitem__(self, row_id):
+        pos = self._position(row_id)
+        if pos < 0:
+            raise KeyError(row_id)
+        return self.blob[self.offsets[pos]:self.offsets[pos + 1]].decode('utf-8')
+
+    def lookup(self, row_ids):
+        """URLs for an array of ids (e.g. a row of FAISS results) in order, skipping unknown ids and -1."""
+        if not len(self.ids):
+            return []
+        row_ids = np.asarray(row_ids, dtype='int64')
+        pos = np.minimum(np.searchsorted(self.ids, row_ids), len(self.ids) - 1)
+        offsets, blob = self.offsets, self.blob
+        return [blob[offsets[p]:offsets[p + 1]].decode('utf-8')
+                for p in pos[self.ids[pos] == row_ids].tolist()]
+
+    def save(self, path=LABELS_PATH):
+        """Write the table to path atomically (see save_index)."""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, ids=self.ids, offsets=self.offsets, blob=np.frombuffer(self.blob, dtype='uint8'))
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path=LABELS_PATH):
+        with np.load(path) as data:
+            return cls(data['ids'], data['offsets'], data['blob'].tobytes())
+
+def build_index(embeddings, ids):
+    """
+    Train and fill a new FAISS index with embeddings, stored under their DB ids.
+    Returns the index.
+    """
+    n, dimension = embeddings.shape
+    ids = np.asarray(ids, dtype='int64')
+    # Vectors are unit length, so inner product ranks exactly like L2 with less work per comparison
+    # (normalized in place in case rows were stored by a version that didn't normalize)
+    faiss.normalize_L2(embeddings)
+    if n <= FLAT_INDEX_MAX:
+        # Exact search is cheap at this size and needs no training
+        new_index = faiss.index_factory(dimension, "IDMap2,Flat", faiss.METRIC_INNER_PRODUCT)
+        new_index.add_with_ids(embeddings, ids)
+        return new_index
+
+    # Each list should get at least ~39 training points
+    nlist = NLIST or int(4 * math.sqrt(n))
+    nlist = max(1, min(nlist, n // 39))
+    new_index = faiss.index_factory(dimension, INDEX_FACTORY_STRING.format(nlist=nlist), faiss.METRIC_INNER_PRODUCT)
+    if n > TRAIN_SAMPLE_MAX:
+        sample = np.random.default_rng(0).choice(n, TRAIN_SAMPLE_MAX, replace=False)
+        new_index.train(embeddings[sample])
+    else:
+        new_index.train(embeddings)
+    # IVF indexes store the ids themselves, so results are DB ids without an ID map
+    new_index.add_with_ids(embeddings, ids)
+    set_nprobe(new_index)
+    logger.info(f"Trained {INDEX_FACTORY_STRING.format(nlist=nlist)} index on {n} vectors")
+    return new_index
 
 def reconstruct_index():
     """
@@ -78,11 +247,15 @@ def reconstruct_index():
         - If embedding exists in DB, load it.
         - Else if snippet exists, embed it and save to DB.
         - Skip otherwise.
+    When snippets were embedded while scraping (ZeroMain's index worker), this
+    only has to train the index and add the stored vectors.
     """
     global index, url_labels
     get_model()
     rows = load_all_rows()
     embeddings = []
+    row_ids = []
+    urls = []
     url_labels = []
 
     logger.info("Reconstructing FAISS index...")
@@ -91,16 +264,18 @@ def reconstruct_index():
         row_id = row['id']
         url = row['url']
         snippet = row['snippet']
-        db_embedding = pickle.loads(row['embedding']) if row['embedding'] else None
+        db_embedding = decode_embedding(row['embedding']) if row['embedding'] else None
 
         if db_embedding is not None:
             embeddings.append(db_embedding)
-            url_labels.append(url)
+            row_ids.append(row_id)
+            urls.append(url)
         elif snippet:
             embedding = embed_text(snippet)
             save_embedding_to_db(row_id, embedding)
             embeddings.append(embedding)
-            url_labels.append(url)
+            row_ids.append(row_id)
+            urls.append(url)
         else:
             continue
 
@@ -108,28 +283,39 @@ def reconstruct_index():
         logger.warning("No embeddings found. Index is empty.")
         return
 
-    embeddings = np.vstack(embeddings)
-    dimension = embeddings.shape[1]
+    embeddings = np.vstack(embeddings).astype('float32')
 
-    # Build FAISS index
+    # Build FAISS index, keyed by DB id so search results map straight to rows
     global index
-    index = faiss.index_factory(dimension, INDEX_FACTORY_STRING)
-    index.train(embeddings)
-    index.add(embeddings)
-    index.nprobe = NPROBE  # Set nprobe after training
+    index = build_index(embeddings, row_ids)
+    url_labels = UrlLabels.from_pairs(row_ids, urls)
 
     logger.info(f"FAISS index reconstructed with {len(url_labels)} entries.")
 
-    # Automatically save index after reconstruction
+    # Automatically save index after reconstruction, then its labels
+    # (written second, so a labels file never looks newer than a stale index)
     save_index()
+    url_labels.save()
 
 def save_index(path=FAISS_INDEX_PATH):
-    """Save FAISS index to disk (not memory-mapped by default)."""
+    """
+    Save FAISS index to disk atomically.
+    The index is written to a temporary file and renamed over path, so a search
+    memory-mapping the index never sees a half-written file; it keeps reading
+    the old one until it reopens path.
+    """
     if index is None:
         logger.warning("No index to save.")
         return
 
-    faiss.write_index(index, path)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        faiss.write_index(index, tmp_path)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
     logger.info(f"FAISS index saved to {path}")
 
 def load_index(path=FAISS_INDEX_PATH):
@@ -137,7 +323,7 @@ def load_index(path=FAISS_INDEX_PATH):
     global index
     try:
         index = faiss.read_index(path)
-        index.nprobe = NPROBE
+        set_nprobe(index)
         logger.info(f"FAISS index loaded from {path}")
     except Exception as e:
         logger.error(f"Failed to load FAISS index: {e}")
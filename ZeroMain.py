@@ -2,31 +2,130 @@
 import time
 import logging
 from typing import List, Optional, Any
-# Import the modules we'll be working with
-from ZeroSkan import start_scraping, end_scraping
-from ZeroIndex import reconstruct_index
-from ZeroSearch import search as semantic_search, report as generate_report
+# ZeroSkan, ZeroIndex and ZeroSearch (FAISS, torch, psycopg2, ...) are imported
+# lazily by the handlers that need them, keeping ZeroMain() cheap to start
 import threading
+import queue
+import multiprocessing as mp
+from enum import IntEnum
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, Future
+import numpy as np
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Minimum seconds between GUI progress/status updates while scraping (~20 Hz)
+PROGRESS_EMIT_INTERVAL = 0.05
+# Minimum seconds between GUI refreshes of an AI report while it streams in
+REPORT_EMIT_INTERVAL = 0.1
+# Queries arriving within this window (seconds) are searched together, up to QUERY_BATCH_MAX
+QUERY_BATCH_WINDOW = 0.05
+QUERY_BATCH_MAX = 32
+# Embedding size of all-MiniLM-L6-v2 and number of results per query
+EMBED_DIM = 384
+SEARCH_RESULTS = 10
+# Scraped snippets are embedded in batches of this size while scraping runs
+EMBED_BATCH_SIZE = 128
+# Bound on scraped snippets waiting to be embedded (back-pressure on the scrapers)
+EMBED_QUEUE_MAX = 1024
+
+
+def _noop(*args):
+    """Stand-in for GUI callbacks whose placeholder output would not be logged anyway"""
+
+def _log_traceback():
+    """Log the exception being handled with its traceback, only when DEBUG logging is on"""
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Traceback:", exc_info=True)
+
+def _progress_tick(scraped, total, last, step):
+    """Return (progress_percent, should_emit) for a scraping progress update"""
+    if total <= 0:
+        return 0.0, False
+    percent = (scraped / total) * 100.0
+    return percent, (percent - last) >= step or scraped >= total
+
+_compiled_progress_tick = None
+
+def _get_progress_tick():
+    """JIT-compile _progress_tick with numba on first use, falling back to plain Python"""
+    global _compiled_progress_tick
+    if _compiled_progress_tick is None:
+        try:
+            from numba import njit
+            _compiled_progress_tick = njit(cache=True)(_progress_tick)
+            # Compile now, with the argument types the callback uses. The callback runs
+            # in the forked scraping processes, which then inherit the compiled code
+            _compiled_progress_tick(0, 1, 0.0, 1.0)
+        except ImportError:
+            logger.debug("numba not found, using the pure Python progress tick")
+            _compiled_progress_tick = _progress_tick
+    return _compiled_progress_tick
+
+class State(IntEnum):
+    """Application states driven by ZeroMain.loop()"""
+    HALT = 0
+    INDEX = 1
+    SEARCH = 2
+    SAVE_SHUTDOWN = 3
+
 class ZeroMain:
+    # No per-instance __dict__: state/running are read on every loop iteration.
+    # ZeroGUI assigns the gui_* callbacks from outside, so they must stay listed here.
+    # running/indexing_in_progress are properties over the two Events.
+    __slots__ = (
+        "state", "_running_event", "current_domains", "ai_mode", "search_results",
+        "_indexing_event", "gui",
+        "gui_update_status", "gui_show_results", "gui_update_progress",
+        "gui_request_domains", "gui_request_query", "gui_request_ai_mode",
+        "gui_request_search_params",
+        "gui_notify_indexing_complete",
+        "_cv", "_state_changed", "_executor", "_embed_executor", "_current_future",
+        "_query_queue",
+        "_q_buf", "_dist_buf", "_idx_buf",
+        "_search_one_fn", "_search_fn", "_report_fn", "_reload_index_fn", "_reconstruct_fn",
+        "_start_scraping_fn", "_end_scraping_fn",
+    )
+
     def __init__(self, gui_instance=None):
         """
         Initializes the ZeroMain application logic.
         :param gui_instance: An instance of ZeroGUI for communication.
                              If None, placeholders are used.
         """
-        self.state = "HALT"
-        self.running = True
-        self.current_query = None
+        self.state = State.HALT
+        # Events rather than plain flags, so callers can block on them instead of polling
+        self._running_event = threading.Event()
+        self._running_event.set()
+        self._indexing_event = threading.Event()
+        # Pending (query, ai_mode, Future) tuples, searched in batches by handle_search
+        self._query_queue = queue.SimpleQueue()
         self.current_domains = None
         self.ai_mode = False
         self.search_results = None
-        self.indexing_in_progress = False
         self.gui = gui_instance # Store the GUI instance
+        # Condition used to wake loop() on state transitions instead of polling
+        self._cv = threading.Condition()
+        self._state_changed = False
+        # Heavy handlers (index/search) run here so loop() can still react to shutdown
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="zero-worker")
+        # Long-lived thread for the snippet embedding consumer, reused across indexing runs
+        self._embed_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="zero-embed")
+        self._current_future = None
+        # Reused by every single-query search (only the worker thread searches)
+        self._q_buf = np.empty((1, EMBED_DIM), dtype=np.float32)
+        self._dist_buf = np.empty((1, SEARCH_RESULTS), dtype=np.float32)
+        self._idx_buf = np.empty((1, SEARCH_RESULTS), dtype=np.int64)
+        # Functions from the heavy modules, filled in on first use
+        self._search_one_fn = None
+        self._search_fn = None
+        self._report_fn = None
+        self._reload_index_fn = None
+        self._reconstruct_fn = None
+        self._start_scraping_fn = None
+        self._end_scraping_fn = None
 
         # Assign actual GUI methods or placeholders
         if self.gui:
@@ -36,31 +135,60 @@ class ZeroMain:
             self.gui_request_domains = self.gui.get_domains_from_gui
             self.gui_request_query = self.gui.get_query_from_gui
             self.gui_request_ai_mode = self.gui.get_ai_mode_from_gui
+            self.gui_request_search_params = self.gui.get_search_params
             self.gui_notify_indexing_complete = self.gui.on_indexing_finished # Or a custom method if needed
         else:
-            # Fallback to placeholders if no GUI instance is provided
-            self.gui_update_status = self._placeholder_gui_update_status
+            # Fallback to placeholders if no GUI instance is provided. The status and
+            # progress placeholders only log, so skip them entirely when that level is off
+            self.gui_update_status = (self._placeholder_gui_update_status
+                                      if logger.isEnabledFor(logging.INFO) else _noop)
             self.gui_show_results = self._placeholder_gui_show_results
-            self.gui_update_progress = self._placeholder_gui_update_progress
+            self.gui_update_progress = (self._placeholder_gui_update_progress
+                                        if logger.isEnabledFor(logging.DEBUG) else _noop)
             self.gui_request_domains = self._placeholder_gui_request_domains
             self.gui_request_query = self._placeholder_gui_request_query
             self.gui_request_ai_mode = self._placeholder_gui_request_ai_mode
+            self.gui_request_search_params = self._placeholder_gui_request_search_params
             self.gui_notify_indexing_complete = self._placeholder_gui_notify_indexing_complete
 
         logger.info("ZeroMain initialized")
 
+    @property
+    def running(self) -> bool:
+        """True until shutdown has been requested"""
+        return self._running_event.is_set()
+
+    @running.setter
+    def running(self, value: bool):
+        if value:
+            self._running_event.set()
+        else:
+            self._running_event.clear()
+
+    @property
+    def indexing_in_progress(self) -> bool:
+        """True while handle_index is scraping/indexing"""
+        return self._indexing_event.is_set()
+
+    @indexing_in_progress.setter
+    def indexing_in_progress(self, value: bool):
+        if value:
+            self._indexing_event.set()
+        else:
+            self._indexing_event.clear()
+
     # --- Placeholder GUI Communication Functions (Fallback) ---
     def _placeholder_gui_update_status(self, status: str):
         """Placeholder for GUI status update function"""
-        logger.info(f"GUI Status Update: {status}")
+        logger.info("GUI Status Update: %s", status)
 
     def _placeholder_gui_show_results(self, results: Any):
         """Placeholder for GUI results display function"""
-        logger.info(f"GUI Results Display: {results}") # Log type/info
+        logger.info("GUI Results Display: %s", results) # Log type/info
 
     def _placeholder_gui_update_progress(self, progress: float):
         """Placeholder for GUI progress update function"""
-        logger.debug(f"GUI Progress Update: {progress}%")
+        logger.debug("GUI Progress Update: %s%%", progress)
 
     def _placeholder_gui_request_domains(self) -> List[str]:
         """Placeholder for GUI domains request function"""
@@ -77,155 +205,391 @@ class ZeroMain:
         logger.info("GUI AI Mode Request")
         return False # Default fallback
 
+    def _placeholder_gui_request_search_params(self) -> tuple:
+        """Placeholder for GUI (query, ai_mode) request function"""
+        logger.info("GUI Search Params Request")
+        return "machine learning", False # Default fallback
+
     def _placeholder_gui_notify_indexing_complete(self):
         """Placeholder for GUI indexing completion notification"""
         logger.info("GUI Notified: Indexing process completed (success or failure)")
 
+    # --- Lazy imports of the heavy modules ---
+    def _get_search(self):
+        """Import ZeroSearch on first use, returning (search, search_batch, report_stream)"""
+        if self._search_fn is None:
+            from ZeroSearch import search, search_batch, report_stream, reload_index
+            self._search_one_fn, self._search_fn = search, search_batch
+            self._report_fn, self._reload_index_fn = report_stream, reload_index
+        return self._search_one_fn, self._search_fn, self._report_fn
+
+    def _get_reconstruct_index(self):
+        """Import ZeroIndex on first use, returning reconstruct_index"""
+        if self._reconstruct_fn is None:
+            from ZeroIndex import reconstruct_index
+            self._reconstruct_fn = reconstruct_index
+        return self._reconstruct_fn
+
+    def _get_scraping(self):
+        """Import ZeroSkan on first use, returning (start_scraping, end_scraping)"""
+        if self._start_scraping_fn is None:
+            from ZeroSkan import start_scraping, end_scraping
+            self._start_scraping_fn, self._end_scraping_fn = start_scraping, end_scraping
+        return self._start_scraping_fn, self._end_scraping_fn
+
     # --- Main Application Loop ---
     def loop(self):
         """Main application loop"""
         logger.info("Starting ZeroMain loop")
-        while self.running:
-            if self.state == "HALT":
-                self.handle_halt()
-            elif self.state == "INDEX":
-                self.handle_index()
-            elif self.state == "SEARCH":
-                self.handle_search()
-            elif self.state == "SAVE_SHUTDOWN":
-                self.handle_save_shutdown()
-            time.sleep(0.1)  # Prevent busy waiting
+        # Bound once, these are read on every iteration
+        cv = self._cv
+        is_running = self._running_event.is_set
+
+        def woken():
+            return self._state_changed or not is_running()
+
+        while is_running():
+            # Block until change_state() signals a transition or shutdown is requested
+            with cv:
+                cv.wait_for(woken)
+                self._state_changed = False
+                state = self.state
+            # Dispatch outside the lock so handlers can change state themselves.
+            # INDEX and SEARCH are handed to the worker thread, so the loop is
+            # free to pick up a SAVE_SHUTDOWN while they are still running.
+            match state:
+                case State.INDEX:
+                    self._submit_job(self.handle_index)
+                case State.SEARCH:
+                    self._submit_job(self.handle_search)
+                case State.SAVE_SHUTDOWN:
+                    self.handle_save_shutdown()
+                case _:
+                    self.handle_halt()
+
+    def _submit_job(self, handler):
+        """Queue a state handler on the worker thread"""
+        try:
+            self._current_future = self._executor.submit(handler)
+        except RuntimeError:
+            # Executor already shut down, nothing more to run
+            logger.warning("Worker executor is shut down, ignoring job")
 
     def handle_halt(self):
-        """Handle HALT state - wait for commands or inputs"""
-        # In a real implementation, this would wait for GUI events or other triggers
-        time.sleep(1)
+        """Handle HALT state - nothing to do, loop() waits on the condition for the next command"""
+        pass
 
     def handle_index(self):
         """Handle INDEX state - run indexing process"""
         logger.info("Entering INDEX state")
-        self.gui_update_status("Starting indexing process...")
-        indexing_success = False
+        # GUI callbacks bound once for the whole run, including the per-URL progress callback
+        update_status = self.gui_update_status
+        update_progress = self.gui_update_progress
+        update_status("Starting indexing process...")
         try:
-            if self.current_domains is None:
-                self.current_domains = self.gui_request_domains()
+            with self._cv:
+                domains = self.current_domains
+            if domains is None:
+                domains = self.gui_request_domains()
+            with self._cv:
+                # Domains and the in-progress flag are published together
+                self.current_domains = domains
+                self.indexing_in_progress = bool(domains)
             if not self.current_domains:
                 logger.warning("No domains provided for indexing")
-                self.gui_update_status("No domains provided for indexing")
-                self.change_state("HALT")
+                update_status("No domains provided for indexing")
+                self.change_state(State.HALT)
                 return
-            self.gui_update_status(f"Indexing domains: {', '.join(self.current_domains)}")
-            logger.info(f"Domains to index: {self.current_domains}")
-
-            self.indexing_in_progress = True
+            update_status(f"Indexing domains: {', '.join(self.current_domains)}")
+            logger.info("Domains to index: %s", self.current_domains)
 
             # --- Initialize progress tracking variables ---
             total_urls_to_scrape = 0
             scraped_count = 0
             last_reported_progress = 0.0
+            last_emit_ts = 0.0
+            start_scraping, end_scraping = self._get_scraping()
+            progress_tick = _get_progress_tick()
+            # Bound once per indexing run rather than looked up on every scraped URL
+            monotonic = time.monotonic
 
             # --- Define the progress callback function ---
             def scraping_progress_callback(current_count, success_flag):
-                nonlocal scraped_count, total_urls_to_scrape, last_reported_progress
+                nonlocal scraped_count, last_reported_progress, last_emit_ts
                 scraped_count = current_count
-                if total_urls_to_scrape > 0:
-                    progress_percent = (scraped_count / total_urls_to_scrape) * 100
-                    # Only update GUI if progress has changed significantly (e.g., by 1%) to avoid excessive updates
-                    if progress_percent - last_reported_progress >= 1.0 or progress_percent >= 100:
-                         self.gui_update_progress(progress_percent)
-                         last_reported_progress = progress_percent
-                         self.gui_update_status(f"Indexing... {scraped_count}/{total_urls_to_scrape} ({progress_percent:.1f}%)")
+                # Only update GUI if progress has changed significantly (e.g., by 1%) and not more
+                # often than PROGRESS_EMIT_INTERVAL; the final update is always emitted
+                progress_percent, should_emit = progress_tick(scraped_count, total_urls_to_scrape,
+                                                              last_reported_progress, 1.0)
+                if should_emit:
+                    now = monotonic()
+                    if progress_percent >= 100 or now - last_emit_ts > PROGRESS_EMIT_INTERVAL:
+                        last_emit_ts = now
+                        last_reported_progress = progress_percent
+                        # Status text is only formatted when it is actually sent to the GUI
+                        update_progress(progress_percent)
+                        update_status(f"Indexing... {scraped_count}/{total_urls_to_scrape} ({progress_percent:.1f}%)")
 
             # --- Start scraping and get total URL count ---
-            self.gui_update_status("Discovering and queuing URLs...")
-            # Pass the callback to start_scraping
-            total_urls_to_scrape = start_scraping(self.current_domains, progress_cb=scraping_progress_callback)
-
-            if self.state != "INDEX": # Check if interrupted during scraping setup/start
+            update_status("Discovering and queuing URLs...")
+            # Snippets are embedded by a consumer thread while the scrapers keep fetching
+            doc_q = mp.Queue(maxsize=EMBED_QUEUE_MAX)
+            index_worker = self._embed_executor.submit(self._index_worker, doc_q, end_scraping)
+            try:
+                # Pass the callback to start_scraping
+                total_urls_to_scrape = start_scraping(self.current_domains,
+                                                      progress_cb=scraping_progress_callback,
+                                                      output_queue=doc_q)
+            finally:
+                # Sentinel: flush the last partial batch and stop the consumer.
+                # Give up once the consumer is gone, it can no longer make room in a full queue
+                while not index_worker.done():
+                    try:
+                        doc_q.put(None, timeout=1)
+                        break
+                    except queue.Full:
+                        pass
+                index_worker.result()
+
+            if self.state != State.INDEX: # Check if interrupted during scraping setup/start
                 logger.info("Indexing interrupted during setup.")
-                self.gui_update_status("Indexing interrupted.")
-                self.indexing_in_progress = False
-                self.current_domains = None
+                update_status("Indexing interrupted.")
+                with self._cv:
+                    self.indexing_in_progress = False
+                    self.current_domains = None
                 self.gui_notify_indexing_complete()
                 return
 
             # --- Ensure final progress update after scraping completes ---
             if total_urls_to_scrape > 0:
                  final_progress = (scraped_count / total_urls_to_scrape) * 100
-                 self.gui_update_progress(final_progress)
-                 self.gui_update_status(f"Scraping completed: {scraped_count}/{total_urls_to_scrape} ({final_progress:.1f}%)")
+                 update_progress(final_progress)
+                 update_status(f"Scraping completed: {scraped_count}/{total_urls_to_scrape} ({final_progress:.1f}%)")
             else:
-                 self.gui_update_status("Scraping phase completed.")
+                 update_status("Scraping phase completed.")
 
             # --- Reconstruct the FAISS index after scraping ---
-            self.gui_update_status("Reconstructing search index...")
+            # Embeddings are already stored, so this trains the index and adds them
+            update_status("Reconstructing search index...")
             logger.info("Starting FAISS index reconstruction...")
+            reconstruct_index = self._get_reconstruct_index()
             reconstruct_index()
+            # Swap ZeroSearch's cached index for the rebuilt one (nothing cached if it was never imported)
+            if self._reload_index_fn is not None:
+                self._reload_index_fn()
             logger.info("FAISS index reconstruction completed.")
-            self.gui_update_status("Indexing completed successfully")
+            update_status("Indexing completed successfully")
             logger.info("Indexing process completed successfully")
-            indexing_success = True
 
         except Exception as e:
-            error_msg = f"Error during indexing: {e}"
-            logger.error(error_msg, exc_info=True)
-            self.gui_update_status(f"Indexing failed: {str(e)}")
+            logger.error("Error during indexing: %s", e)
+            _log_traceback()
+            update_status(f"Indexing failed: {str(e)}")
         finally:
-            self.indexing_in_progress = False
-            self.current_domains = None
+            with self._cv:
+                self.indexing_in_progress = False
+                self.current_domains = None
+                # Wake wait_indexing_done() callers
+                self._cv.notify_all()
             self.gui_notify_indexing_complete()
-            self.change_state("HALT")
+            self.change_state(State.HALT)
             logger.debug("Exited INDEX state, returned to HALT")
 
 
+    def _index_worker(self, doc_q, end_scraping):
+        """
+        Consume (row_id, snippet) from doc_q, embedding and storing them in batches until None.
+        If embedding breaks down, scraping is stopped and doc_q is still drained up to the
+        sentinel, so no scraper process (or the sentinel put) blocks on a full queue.
+        """
+        row_ids, snippets = [], []
+        got_sentinel = False
+        try:
+            from ZeroIndex import embed_texts, save_embeddings_to_db
+
+            def flush():
+                try:
+                    save_embeddings_to_db(row_ids, embed_texts(snippets, batch_size=EMBED_BATCH_SIZE))
+                except Exception as e:
+                    # reconstruct_index() embeds whatever is still missing
+                    logger.error("Error embedding %d snippets: %s", len(row_ids), e)
+                row_ids.clear()
+                snippets.clear()
+
+            while True:
+                item = doc_q.get()
+                if item is None:
+                    got_sentinel = True
+                    break
+                row_ids.append(item[0])
+                snippets.append(item[1])
+                if len(row_ids) >= EMBED_BATCH_SIZE:
+                    flush()
+            if row_ids:
+                flush()
+        except Exception as e:
+            logger.error("Snippet embedding stopped: %s", e)
+            _log_traceback()
+            end_scraping()
+            while not got_sentinel:
+                got_sentinel = doc_q.get() is None
+            raise
+
     def handle_search(self):
         """Handle SEARCH state - perform semantic search"""
         logger.info("Entering SEARCH state")
         self.gui_update_status("Starting search...")
+        pending = []
         try:
-            # Get query and AI mode from GUI or prior set values
-            if self.current_query is None:
-                self.current_query = self.gui_request_query()
-            if self.ai_mode is None:
-                self.ai_mode = self.gui_request_ai_mode()
-            if not self.current_query:
+            # Get queued queries, or fall back to the GUI if SEARCH was entered without one
+            pending = self._drain_queries()
+            if not pending:
+                # Query and AI mode come from the GUI in a single call
+                query, gui_ai_mode = self.gui_request_search_params()
+                if query:
+                    with self._cv:
+                        ai_mode = gui_ai_mode if self.ai_mode is None else self.ai_mode
+                    pending = [(query, ai_mode, Future())]
+            if not pending:
                 logger.warning("No query provided for search")
                 self.gui_update_status("No query provided")
-                self.change_state("HALT")
-                return
-
-            self.gui_update_status(f"Searching for: {self.current_query}")
-            logger.info(f"Performing semantic search for query: '{self.current_query}'")
-
-            # --- Perform semantic search ---
-            results = semantic_search(self.current_query, amount=10)
-            logger.debug(f"Raw search results (URLs): {results}")
-            final_results = results # Default to URL list
-
-            if self.ai_mode:
-                self.gui_update_status("Generating AI report...")
-                logger.info("AI mode enabled, generating report...")
-                # --- Generate AI report from search results ---
-                final_results = generate_report(results)
-                logger.debug("AI report generation completed.")
-
-            # --- Display results in GUI ---
-            self.gui_show_results(final_results)
-            self.gui_update_status("Search completed")
+            while pending:
+                self._search_batch(pending)
+                # Queries submitted while we were busy are searched before leaving SEARCH
+                pending = self._drain_queries()
 
         except Exception as e:
-            error_msg = f"Error during search: {e}"
-            logger.error(error_msg, exc_info=True) # Log full traceback
+            logger.error("Error during search: %s", e)
+            _log_traceback() # Full traceback at DEBUG level
             self.gui_update_status(f"Search failed: {str(e)}")
             # Show error in results area as well
             self.gui_show_results(f"Search failed: {str(e)}")
+            for _, _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
         finally:
             # --- Cleanup and State Transition ---
-            # Reset for next search
-            self.current_query = None
-            self.ai_mode = None
-            self.change_state("HALT")
-            logger.debug("Exited SEARCH state, returned to HALT")
+            # The empty check, the reset and the switch to HALT are one locked step:
+            # start_search() queues under the same lock, and its change_state(SEARCH) is
+            # a no-op while we are still in SEARCH, so a query queued after our last
+            # drain must be picked up here
+            with self._cv:
+                self.ai_mode = None
+                if self._query_queue.empty():
+                    self.change_state(State.HALT)
+                    logger.debug("Exited SEARCH state, returned to HALT")
+                else:
+                    # Stay in SEARCH and have loop() dispatch handle_search again
+                    self._state_changed = True
+                    self._cv.notify_all()
+
+    def _drain_queries(self) -> list:
+        """Collect queued queries, waiting briefly so back-to-back submissions share one batch"""
+        try:
+            pending = [self._query_queue.get_nowait()]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + QUERY_BATCH_WINDOW
+        while len(pending) < QUERY_BATCH_MAX:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                pending.append(self._query_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return pending
+
+    def _search_batch(self, pending: list):
+        """Search a batch of (query, ai_mode, Future) entries with one embedding + FAISS call"""
+        show_results = self.gui_show_results
+        update_status = self.gui_update_status
+        queries = [query for query, _, _ in pending]
+        # Snapshot of the mode set via set_ai_mode(), shared with the dispatcher
+        with self._cv:
+            default_ai_mode = self.ai_mode
+        update_status(f"Searching for: {', '.join(queries)}")
+        logger.info("Performing semantic search for %d queries: %s", len(queries), queries)
+
+        # --- Perform semantic search ---
+        semantic_search, semantic_search_batch, _ = self._get_search()
+        if len(queries) == 1:
+            # The common case: search into the preallocated buffers, no per-query arrays
+            batch_results = [semantic_search(queries[0], amount=SEARCH_RESULTS,
+                                             q_buf=self._q_buf, out_dist=self._dist_buf,
+                                             out_idx=self._idx_buf)]
+        else:
+            batch_results = semantic_search_batch(queries, amount=SEARCH_RESULTS)
+
+        for (query, ai_mode, future), results in zip(pending, batch_results):
+            logger.debug("Raw search results (URLs) for %r: %s", query, results)
+            if ai_mode is None:
+                # No per-query setting, use the one set via set_ai_mode() or ask the GUI
+                if default_ai_mode is None:
+                    # Asked outside the lock, kept unless set_ai_mode() was called meanwhile
+                    gui_ai_mode = self.gui_request_ai_mode()
+                    with self._cv:
+                        if self.ai_mode is None:
+                            self.ai_mode = gui_ai_mode
+                        default_ai_mode = self.ai_mode
+                ai_mode = default_ai_mode
+
+            # --- Display results in GUI ---
+            # URLs are shown right away, an AI report replaces them once it is ready
+            show_results(results)
+            if not ai_mode:
+                future.set_result(results)
+                continue
+
+            update_status("Generating AI report...")
+            logger.info("AI mode enabled, generating report...")
+            # --- Generate AI report from search results on the worker thread ---
+            try:
+                report_future = self._executor.submit(self._generate_report, results)
+            except RuntimeError:
+                # Shutting down, nothing left to generate the report on
+                future.set_result(results)
+                continue
+            report_future.add_done_callback(partial(self._on_report_done, future))
+        update_status("Search completed")
+
+    def _generate_report(self, urls: list) -> str:
+        """Generate an AI report on the worker thread, showing it in the GUI while it streams in"""
+        show_results = self.gui_show_results
+        is_running = self._running_event.is_set
+        chunks = self._get_search()[2](urls)
+        parts = []
+        last_emit_ts = 0.0
+        try:
+            for chunk in chunks:
+                if not is_running():
+                    # Shutting down, stop the generation instead of waiting for the rest
+                    break
+                parts.append(chunk)
+                now = time.monotonic()
+                if now - last_emit_ts >= REPORT_EMIT_INTERVAL:
+                    show_results("".join(parts))
+                    last_emit_ts = now
+        finally:
+            chunks.close()
+        return "".join(parts).strip()
+
+    def _on_report_done(self, future: Future, report_future: Future):
+        """Show a finished AI report and resolve the query's Future with it"""
+        if report_future.cancelled():
+            future.cancel()
+            return
+        error = report_future.exception()
+        if error is not None:
+            logger.error("Error generating AI report: %s", error)
+            self.gui_show_results(f"Report generation failed: {error}")
+            future.set_exception(error)
+            return
+        logger.debug("AI report generation completed.")
+        final_results = report_future.result()
+        self.gui_show_results(final_results)
+        self.gui_update_status("AI report completed")
+        future.set_result(final_results)
 
     def handle_save_shutdown(self):
         """Handle SAVE/SHUTDOWN state - save data and shutdown"""
@@ -233,76 +597,116 @@ class ZeroMain:
         self.gui_update_status("Saving data and shutting down...")
         try:
             # --- Save any ongoing work ---
-            # This should signal scraping to stop and save state
-            end_scraping()
+            # This should signal scraping to stop and save state; ZeroSkan's shutdown
+            # event is a multiprocessing Event, so it reaches the scraping processes.
+            # Nothing to stop if ZeroSkan was never imported
+            if self._end_scraping_fn is not None:
+                self._end_scraping_fn()
             logger.info("Scraping processes terminated/saved")
+            # Drop queued jobs; a running handler finishes on its own once scraping stops
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._embed_executor.shutdown(wait=False, cancel_futures=True)
             self.gui_update_status("Shutdown completed")
             logger.info("Shutdown process completed successfully")
         except Exception as e:
-            error_msg = f"Error during shutdown: {e}"
-            logger.error(error_msg, exc_info=True) # Log full traceback
+            logger.error("Error during shutdown: %s", e)
+            _log_traceback() # Full traceback at DEBUG level
             self.gui_update_status(f"Shutdown error: {str(e)}")
         finally:
             # --- Stop the main loop ---
-            self.running = False
-            self.state = "HALT"
+            with self._cv:
+                self.running = False
+                self.state = State.HALT
+                self._cv.notify_all()
             logger.info("Application marked for shutdown.")
 
     # --- State Management and External Triggers ---
-    def change_state(self, new_state: str) -> str:
-        """Change the current state of the application"""
-        allowed_states = ["HALT", "INDEX", "SEARCH", "SAVE_SHUTDOWN"]
-        if new_state in allowed_states:
-            logger.info(f"Changing state from {self.state} to {new_state}")
+    def change_state(self, new_state) -> str:
+        """Change the current state of the application (a State or its name, e.g. "INDEX")"""
+        if not isinstance(new_state, State):
+            try:
+                new_state = State[new_state]
+            except (KeyError, TypeError):
+                logger.warning("Invalid state change requested: %r", new_state)
+                return "invalid input"
+        with self._cv:
+            if new_state is self.state:
+                # Already there: don't wake loop() to dispatch the same handler again
+                return "done"
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Changing state from %s to %s", self.state.name, new_state.name)
             self.state = new_state
-            return "done"
-        else:
-            logger.warning(f"Invalid state change requested: {new_state}")
-            return "invalid input"
-
-    def insert_query(self, query: str):
-        """Insert a search query"""
-        self.current_query = query
-        logger.info(f"Query inserted: {query}")
+            self._state_changed = True
+            self._cv.notify_all()
+        return "done"
+
+    def insert_query(self, query: str, ai_mode: bool = None) -> Future:
+        """Queue a search query; the returned Future resolves to its results"""
+        future = Future()
+        self._query_queue.put((query, ai_mode, future))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Query inserted: %s", query)
+        return future
 
     def set_ai_mode(self, ai_mode: bool):
         """Set AI mode for search results"""
-        self.ai_mode = ai_mode
-        logger.info(f"AI mode set to: {ai_mode}")
+        with self._cv:
+            self.ai_mode = ai_mode
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("AI mode set to: %s", ai_mode)
 
     def set_domains(self, domains: List[str]):
         """Set domains for indexing"""
-        self.current_domains = domains
-        logger.info(f"Domains set for indexing: {domains}")
+        with self._cv:
+            self.current_domains = domains
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Domains set for indexing: %s", domains)
 
-        def start_indexing(self, domains: List[str] = None):
+    def start_indexing(self, domains: List[str] = None):
         """Start the indexing process"""
-        if domains:
-            self.set_domains(domains)
-        self.change_state("INDEX")
-
-    def start_search(self, query: str = None, ai_mode: bool = None):
-        """Start the search process"""
-        # Optionally set query and AI mode if provided
-        if query:
-            self.insert_query(query)
-        if ai_mode is not None: # Boolean, so check for None explicitly
-            self.set_ai_mode(ai_mode)
-        # Transition to SEARCH state, which triggers handle_search
-        self.change_state("SEARCH")
+        # Set the domains and transition in one step so handle_index never sees a half update
+        with self._cv:
+            if domains:
+                self.set_domains(domains)
+            self.change_state(State.INDEX)
+
+    def start_search(self, query: str = None, ai_mode: bool = None) -> Optional[Future]:
+        """Start the search process, returning a Future for the query's results if one was given"""
+        future = None
+        with self._cv:
+            # Optionally queue the query with its AI mode if provided
+            if query:
+                future = self.insert_query(query, ai_mode)
+            elif ai_mode is not None: # Boolean, so check for None explicitly
+                self.set_ai_mode(ai_mode)
+            # A running search drains the queue before returning to HALT, and
+            # change_state() is a no-op while in SEARCH, so no second handler is queued
+            self.change_state(State.SEARCH)
+        return future
 
     def request_shutdown(self):
         """Request application shutdown"""
-        # Transition to SAVE_SHUTDOWN state, which triggers handle_save_shutdown
-        self.change_state("SAVE_SHUTDOWN")
+        # Transition to SAVE_SHUTDOWN state, which triggers handle_save_shutdown.
+        # running stays set until that handler has run: clearing it here could make
+        # loop() exit between dispatches without ever dispatching SAVE_SHUTDOWN
+        self.change_state(State.SAVE_SHUTDOWN)
 
     def get_current_state(self) -> str:
-        """Get the current state of the application"""
-        return self.state
+        """Get the name of the current state of the application (e.g. "INDEX")"""
+        with self._cv:
+            return self.state.name
 
     def is_indexing(self) -> bool:
         """Check if indexing is currently in progress"""
-        return self.indexing_in_progress
+        return self._indexing_event.is_set()
+
+    def wait_indexing_done(self, timeout: float = None) -> bool:
+        """Block until no indexing is in progress; returns False if timeout expired first"""
+        if not self._indexing_event.is_set():
+            return True
+        # Event only signals "set", so wait on the condition for it to be cleared
+        with self._cv:
+            return self._cv.wait_for(lambda: not self._indexing_event.is_set(), timeout)
 
 
 # Example usage (if run directly):
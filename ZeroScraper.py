@@ -1,17 +1,37 @@
 # ZeroScraper.py
 
 import requests
-from validators import url as validate_url
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.exceptions import HTTPError as Urllib3HTTPError
 from urllib.robotparser import RobotFileParser
-from urllib.parse import urlparse, urljoin
-from bs4 import BeautifulSoup
+from urllib.parse import urlparse, urljoin, urlunparse
+from bs4 import BeautifulSoup, SoupStrainer
 import time
 import re
+import threading
 import trafilatura
 from requests.exceptions import RequestException
 import json
 import logging
-from config import COMMON_CRAWL_INDEX_NAME, MAX_URLS_PER_DOMAIN
+# orjson parses the CDX JSON lines several times faster than the json module
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
+# lxml is a C parser, much faster than the pure Python html.parser
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+# selectolax (Lexbor/Modest, C) extracts snippets faster still than BeautifulSoup + lxml
+try:
+    from selectolax.parser import HTMLParser as FastHTMLParser
+except ImportError:
+    FastHTMLParser = None
+from _snippet_core import build_snippet
+from config import COMMON_CRAWL_INDEX_NAME, MAX_URLS_PER_DOMAIN, SCRAPING_THREADS_PER_PROCESS
 
 # Set up logging
 logging.basicConfig(
@@ -22,22 +42,107 @@ logging.basicConfig(
 USER_AGENT = "ZeroWeb/1.0 (Compatible; ZeroScraper; +https://github.com/your-repo)"
 CDX_SERVER = "http://index.commoncrawl.org"
 
+# Default keep-alive session for page requests, sized for one process's scraping threads
+SESSION = requests.Session()
+SESSION.headers.update({'User-Agent': USER_AGENT, 'Connection': 'keep-alive'})
+_adapter = HTTPAdapter(
+    pool_connections=SCRAPING_THREADS_PER_PROCESS,
+    pool_maxsize=SCRAPING_THREADS_PER_PROCESS * 2,
+    # Retry-After is ignored so a 429 can't park a scraper thread for as long as the server asks
+    max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504],
+                      respect_retry_after_header=False)
+)
+SESSION.mount('https://', _adapter)
+SESSION.mount('http://', _adapter)
+
+# Keep-alive session for the paginated Common Crawl index queries
+CDX_SESSION = requests.Session()
+CDX_SESSION.headers.update({'User-Agent': USER_AGENT})
+CDX_SESSION.mount('http://', HTTPAdapter(pool_maxsize=4, max_retries=Retry(total=3, backoff_factor=0.5)))
+CDX_SESSION.mount('https://', HTTPAdapter(pool_maxsize=4, max_retries=Retry(total=3, backoff_factor=0.5)))
+
+# Page bodies are read up to this size, and only for HTML responses
+MAX_RESPONSE_BYTES = 2 * 1024 * 1024
+HTML_CONTENT_TYPES = ('text/html', 'application/xhtml')
+_CHARSET_RE = re.compile(r'charset=["\']?([\w.:-]+)', re.I)
+
+# get_snippet() only needs these tags, so the rest of the document is not built into a tree
+SNIPPET_STRAINER = SoupStrainer(['title', 'meta'])
+
+# URL of the rel="next" entry in a CDX Link header
+_NEXT_LINK_RE = re.compile(r'<([^>]+)>\s*;[^,]*rel="next"')
+
+# Linear-time URL check (no nested quantifiers, so no catastrophic backtracking)
+_URL_RE = re.compile(r'^https?://[A-Za-z0-9._\-]{1,253}(:\d+)?(/[^\s]*)?$')
+
+def fast_validate(url):
+    """Check that url is an absolute http(s) URL with a plausible host"""
+    parsed = urlparse(url)
+    return parsed.scheme in ('http', 'https') and bool(parsed.netloc) and bool(_URL_RE.match(url))
+
+# Parsed robots.txt per (scheme, host), reused for ROBOTS_CACHE_TTL seconds
+ROBOTS_CACHE_TTL = 24 * 60 * 60
+_robots_cache = {}
+_robots_cache_lock = threading.Lock()
+
+# Query parameters that only track the visitor and never change the page
+TRACKING_PARAMS = frozenset({
+    'utm_source', 'utm_medium', 'utm_campaign', 'utm_term', 'utm_content',
+    'fbclid', 'gclid', 'sessionid', 'phpsessid', 'jsessionid',
+})
+DEFAULT_PORTS = {'http': '80', 'https': '443'}
+
+def canonicalize_url(url):
+    """
+    Normalize a URL so variants of the same page compare equal: lowercase scheme and
+    host, no default port, no fragment, tracking parameters dropped, query sorted
+    """
+    parsed = urlparse(url)
+    scheme = parsed.scheme.lower()
+    host, _, port = parsed.netloc.lower().partition(':')
+    netloc = host if not port or DEFAULT_PORTS.get(scheme) == port else f"{host}:{port}"
+    # Raw 'key=value' pairs are filtered and sorted but never re-encoded, so the query
+    # still selects the same page ('?print', ';' inside values, unescaped ',' and ':')
+    query = '&'.join(sorted(pair for pair in parsed.query.split('&')
+                            if pair and pair.split('=', 1)[0].lower() not in TRACKING_PARAMS))
+    return urlunparse((scheme, netloc, parsed.path or '/', parsed.params, query, ''))
+
 def get_robots_parser(domain):
-    """Fetch and parse robots.txt for a domain"""
+    """Fetch and parse robots.txt for a domain (cached per host for ROBOTS_CACHE_TTL)"""
     parsed = urlparse(domain)
     if not parsed.scheme:
         domain = f"https://{domain}"
+        parsed = urlparse(domain)
+
+    cache_key = (parsed.scheme, parsed.netloc)
+    now = time.monotonic()
+    with _robots_cache_lock:
+        cached = _robots_cache.get(cache_key)
+    if cached is not None and now - cached[1] < ROBOTS_CACHE_TTL:
+        return cached[0]
 
     robots_url = urljoin(domain, "/robots.txt")
     parser = RobotFileParser()
     parser.set_url(robots_url)
 
     try:
-        parser.read()
-        return parser
+        # Fetched over the pooled SESSION rather than RobotFileParser.read()'s urllib
+        response = SESSION.get(robots_url, timeout=10)
+        # Same status handling as RobotFileParser.read()
+        if response.status_code in (401, 403):
+            parser.disallow_all = True
+        elif 400 <= response.status_code < 500:
+            parser.allow_all = True
+        else:
+            response.raise_for_status()
+            parser.parse(response.text.splitlines())
     except (RequestException, UnicodeDecodeError) as e:
         logging.warning(f"Failed to fetch robots.txt for {domain}: {e}")
-        return None
+        parser = None
+    # Failures are cached too, so an unreachable robots.txt isn't retried for every call
+    with _robots_cache_lock:
+        _robots_cache[cache_key] = (parser, now)
+    return parser
 
 def get_crawl_delay(parser):
     """Extract crawl delay from robots.txt"""
@@ -60,42 +165,45 @@ def is_allowed_by_robots(parser, url):
     return parser.can_fetch(USER_AGENT, url)
 
 def get_common_crawl_urls(domain, max_urls=MAX_URLS_PER_DOMAIN, crawl_delay=1.0):
-    """Get list of URLs for a domain from Common Crawl"""
-    url_set = set()
+    """Get list of URLs for a domain from Common Crawl, in index order"""
+    # Membership is tracked separately from the ordered result list
+    seen = set()
+    urls = []
     next_page = None
     base_query = f"{CDX_SERVER}/{COMMON_CRAWL_INDEX_NAME}-index?url={domain}/*&output=json"
 
     try:
-        while len(url_set) < max_urls:
+        while len(urls) < max_urls:
             query_url = next_page if next_page else base_query
-            response = requests.get(query_url, timeout=30)
-            response.raise_for_status()
-
-            for line in response.text.splitlines():
-                if not line:
-                    continue
-                try:
-                    record = json.loads(line)
+            # Streamed, so records are parsed as they arrive and the rest of
+            # the page is never downloaded once max_urls is reached
+            with CDX_SESSION.get(query_url, timeout=30, stream=True) as response:
+                response.raise_for_status()
+
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    try:
+                        record = json_loads(line)
+                    except ValueError: # Both JSONDecodeError types subclass ValueError
+                        continue
                     url = record.get('url', '')
-                    if url and url not in url_set:
-                        url_set.add(url)
-                        if len(url_set) >= max_urls:
-                            break
-                except json.JSONDecodeError:
-                    continue
-
-            # Parse Link header correctly
-            link_header = response.headers.get('Link', '')
-            next_page = None
-            if link_header:
-                links = link_header.split(',')
-                for link in links:
-                    if 'rel="next"' in link:
-                        match = re.search(r'<(.+?)>', link)
-                        if match:
-                            next_page = match.group(1)
+                    if not url:
+                        continue
+                    # Deduplicate on the canonical form, the same page is often
+                    # captured with different query orders/tracking parameters
+                    url = canonicalize_url(url)
+                    if url not in seen:
+                        seen.add(url)
+                        urls.append(url)
+                        if len(urls) >= max_urls:
                             break
 
+                # Parse Link header correctly
+                link_header = response.headers.get('Link', '')
+            match = _NEXT_LINK_RE.search(link_header)
+            next_page = match.group(1) if match else None
+
             if not next_page:
                 break
 
@@ -104,7 +212,7 @@ def get_common_crawl_urls(domain, max_urls=MAX_URLS_PER_DOMAIN, crawl_delay=1.0)
     except RequestException as e:
         logging.error(f"Common Crawl error for {domain}: {str(e)}")
 
-    return list(url_set)[:max_urls]
+    return urls
 
 def get_URL_list(domain):
     """
@@ -117,41 +225,115 @@ def get_URL_list(domain):
     common_crawl_urls = get_common_crawl_urls(domain, crawl_delay=crawl_delay)
 
     filtered_urls = [url for url in common_crawl_urls 
-                     if validate_url(url) and is_allowed_by_robots(parser, url)]
+                     if fast_validate(url) and is_allowed_by_robots(parser, url)]
 
     return filtered_urls, crawl_delay
 
-def get_snippet(url):
-    """Get page title and description snippet"""
+def fetch_html(url, session=None, timeout=(3, 10)):
+    """
+    Stream an HTML page, reading at most MAX_RESPONSE_BYTES of its body.
+    Returns (headers, body, encoding): body is the raw bytes (b"" for non-HTML responses,
+    which are not downloaded) and encoding the Content-Type charset, or None if not declared.
+    """
+    http = session or SESSION
+    response = http.get(
+        url,
+        headers={'User-Agent': USER_AGENT},
+        timeout=timeout,
+        allow_redirects=True,
+        stream=True
+    )
     try:
-        response = requests.get(
-            url,
-            headers={'User-Agent': USER_AGENT},
-            timeout=10,
-            allow_redirects=True
-        )
         response.raise_for_status()
-
         headers = dict(response.headers)
+        content_type = response.headers.get('Content-Type', '').lower()
+        if content_type and not content_type.startswith(HTML_CONTENT_TYPES):
+            logging.debug(f"Skipping non-HTML response ({content_type}) from {url}")
+            return headers, b"", None
+        try:
+            body = response.raw.read(MAX_RESPONSE_BYTES, decode_content=True)
+        except Urllib3HTTPError as e:
+            # Reading response.raw bypasses requests' exception wrapping, so read timeouts,
+            # truncated chunked bodies and bad gzip data would escape as urllib3 errors
+            raise RequestException(f"Failed to read response body from {url}: {e}") from e
+        # Only a declared charset is passed on; otherwise the parser detects it from
+        # the document (<meta charset>), rather than requests' ISO-8859-1 default
+        charset = _CHARSET_RE.search(content_type)
+        return headers, body, charset.group(1) if charset else None
+    finally:
+        # Drops the rest of an oversized body instead of downloading it
+        response.close()
+
+def _snippet_fields_selectolax(html, encoding):
+    """Title, description and (only without a description) visible text of a page, parsed with selectolax"""
+    if encoding:
+        try:
+            html = html.decode(encoding, errors='replace')
+        except LookupError: # Unknown declared charset, detect it below
+            pass
+    if isinstance(html, bytes):
+        try:
+            # Without a usable Content-Type charset, most pages are UTF-8
+            html = html.decode('utf-8')
+        except UnicodeDecodeError:
+            pass
+    if isinstance(html, bytes):
+        # selectolax would decode these as UTF-8 too (dropping the bad bytes), so let it use
+        # <meta charset> or sniff the bytes, and fall back to windows-1252 like browsers do
+        tree = FastHTMLParser(html, detect_encoding=True, use_meta_tags=True)
+        if tree.input_encoding == 'UTF-8':
+            tree = FastHTMLParser(html.decode('cp1252', errors='replace'))
+    else:
+        tree = FastHTMLParser(html)
+
+    title_node = tree.css_first('title')
+    title = title_node.text(strip=True) if title_node else ""
+
+    meta_desc = tree.css_first('meta[name="description"]')
+    description = (meta_desc.attributes.get('content') or "").strip() if meta_desc else ""
+
+    text = ""
+    if not description and tree.body:
+        # text() would include script/style contents, which get_text() on the bs4 path skips
+        tree.strip_tags(['script', 'style', 'noscript', 'template'])
+        text = tree.body.text(separator=' ', strip=True)
+    return title, description, text
+
+def _snippet_fields_bs4(html, encoding):
+    """Title, description and (only without a description) visible text of a page, parsed with BeautifulSoup"""
+    # Parse only the title/meta tags, straight from the bytes
+    soup = BeautifulSoup(html, HTML_PARSER, parse_only=SNIPPET_STRAINER, from_encoding=encoding)
+
+    title = ""
+    if soup.title:
+        title = soup.title.string.strip()
+
+    description = ""
+    meta_desc = soup.find('meta', attrs={'name': 'description'})
+    if meta_desc and meta_desc.get('content'):
+        description = meta_desc['content'].strip()
+
+    text = ""
+    if not description:
+        # Visible text needs the full document
+        full_soup = BeautifulSoup(html, HTML_PARSER, from_encoding=encoding)
+        text = full_soup.get_text(separator=' ')
+    return title, description, text
 
-        # Parse only until we find title/description
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        title = ""
-        if soup.title:
-            title = soup.title.string.strip()
-
-        description = ""
-        meta_desc = soup.find('meta', attrs={'name': 'description'})
-        if meta_desc and meta_desc.get('content'):
-            description = meta_desc['content'].strip()
+def get_snippet(url):
+    """Get page title and description snippet"""
+    try:
+        headers, html, encoding = fetch_html(url)
+        if not html:
+            return headers, ""
 
-        if not description:
-            # Extract first 200 chars of visible text
-            visible_text = re.sub(r'\s+', ' ', soup.get_text()).strip()
-            description = visible_text[:200]
+        if FastHTMLParser is not None:
+            title, description, text = _snippet_fields_selectolax(html, encoding)
+        else:
+            title, description, text = _snippet_fields_bs4(html, encoding)
 
-        snippet = f"{title}\n{description}"
+        # Falls back to the first 200 chars of visible text, whitespace collapsed
+        snippet = build_snippet(title, description, text)
         return headers, snippet
 
     except (RequestException, AttributeError) as e:
@@ -160,10 +342,18 @@ def get_snippet(url):
 
 def get_fullpage(url):
     """Get full page content using Trafilatura or BeautifulSoup fallback"""
+    # One download over the pooled SESSION, shared by both extractors
+    try:
+        _, html, encoding = fetch_html(url)
+    except RequestException as e:
+        logging.warning(f"Failed to fetch {url}: {e}")
+        return ""
+    if not html:
+        return ""
+
     try:
-        downloaded = trafilatura.fetch_url(url)
         content = trafilatura.extract(
-            downloaded,
+            html,
             include_links=False,
             include_tables=False,
             output_format="txt"
@@ -175,9 +365,7 @@ def get_fullpage(url):
 
     # Fallback to BeautifulSoup
     try:
-        response = requests.get(url, headers={'User-Agent': USER_AGENT}, timeout=10)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
+        soup = BeautifulSoup(html, HTML_PARSER, from_encoding=encoding)
         return soup.get_text().strip()
     except Exception as e:
         logging.warning(f"Fallback extraction also failed for {url}: {e}")
@@ -1,5 +1,8 @@
 # ZeroSearch++.py (modifications)
-import psycopg2
+import os
+import time
+import json
+import hashlib
 import faiss
 import numpy as np
 import pickle
@@ -13,14 +16,21 @@ except ImportError:
     logging.warning("llama-cpp-python not found. Local LLM reporting will not be available unless installed.")
 
 from config import (
-    DATABASE_CONFIG, FAISS_INDEX_PATH, OPENROUTER_API_KEY, OPENROUTER_MODEL, USE_API,
+    FAISS_INDEX_PATH, OPENROUTER_API_KEY, OPENROUTER_MODEL, USE_API,
     # --- Import local LLM config ---
     USE_LOCAL_LLM, LOCAL_LLM_MODEL_PATH, LOCAL_LLM_N_CTX,
-    LOCAL_LLM_N_THREADS, LOCAL_LLM_PROMPT_TEMPLATE
+    LOCAL_LLM_N_THREADS, LOCAL_LLM_N_GPU_LAYERS, LOCAL_LLM_PROMPT_TEMPLATE, REPORT_MAX_INPUT_TOKENS
 )
 import requests
+import torch
+from requests.adapters import HTTPAdapter
+from collections import defaultdict
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
 from ZeroScraper import get_fullpage
-from psycopg2.extras import RealDictCursor
+from ZeroIndex import set_nprobe, to_gpu_if_enabled, UrlLabels, LABELS_PATH
+from psycopg2.extras import RealDictCursor, execute_values
+from ZeroDB import get_db_connection, release_db_connection, ensure_schema
 from sentence_transformers import SentenceTransformer
 
 # Setup logging
@@ -29,10 +39,29 @@ logger = logging.getLogger(__name__)
 
 # Global variables
 index = None
-url_labels = []
+url_labels = {} # DB id -> URL (UrlLabels once loaded), matching the ids stored in the FAISS index
 EMBEDDING_MODEL = None
+# OpenMP threads for index.search(); FAISS spreads a (B, d) query batch over them.
+# Half the cores, leaving the rest to the query encoder and the GUI
+SEARCH_OMP_THREADS = max(1, (os.cpu_count() or 2) // 2)
+# Queries are short, so the encoder only pads/attends up to this many tokens
+QUERY_MAX_SEQ_LENGTH = 128
 # --- Global variable for local LLM ---
 LOCAL_LLM = None
+# Pooled keep-alive session for the OpenRouter API
+API_SESSION = requests.Session()
+API_SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+# Separates the page texts in a report prompt
+REPORT_TEXT_SEPARATOR = "\n\n---\n\n"
+# Pages missing from the DB are fetched concurrently for a report, one host per worker
+REPORT_FETCH_WORKERS = 16
+# Stored full texts older than this are fetched again (and only rewritten if they changed)
+FULL_TEXT_MAX_AGE = "7 days"
+# Map step of long reports: each page is summarized in at most this many tokens
+SUMMARY_MAX_TOKENS = 256
+SUMMARY_PROMPT_TEMPLATE = "Summarize the key facts of the following page concisely:\n{text}"
+# Rough size of a token, used where the model's tokenizer isn't at hand
+CHARS_PER_TOKEN = 4
 
 # --- Function to initialize the local LLM ---
 def get_local_llm():
@@ -42,12 +71,16 @@ def get_local_llm():
         try:
             logger.info(f"Loading local LLM from {LOCAL_LLM_MODEL_PATH}...")
             # Initialize the LLM. Adjust parameters as needed.
-            # n_gpu_layers=-1 attempts to offload all layers to GPU if available (requires cuBLAS).
+            # n_gpu_layers=-1 offloads all layers to the GPU (needs a GPU build of llama-cpp-python).
             LOCAL_LLM = Llama(
                 model_path=LOCAL_LLM_MODEL_PATH,
                 n_ctx=LOCAL_LLM_N_CTX,
                 n_threads=LOCAL_LLM_N_THREADS,
-                # n_gpu_layers=-1, # Uncomment if you want to use GPU acceleration
+                n_batch=512, # Prompt tokens evaluated per batch during prefill
+                n_gpu_layers=LOCAL_LLM_N_GPU_LAYERS,
+                use_mmap=True, # Page the weights in from the model file instead of copying them
+                use_mlock=False,
+                logits_all=False,
                 verbose=False # Reduce llama-cpp logs
             )
             logger.info("Local LLM loaded successfully.")
@@ -61,19 +94,23 @@ def get_embedding_model():
     """Lazy loading of the embedding model to avoid unnecessary loads."""
     global EMBEDDING_MODEL
     if EMBEDDING_MODEL is None:
-        EMBEDDING_MODEL = SentenceTransformer('all-MiniLM-L6-v2')
-        logger.info("Embedding model loaded")
+        device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        EMBEDDING_MODEL = SentenceTransformer('all-MiniLM-L6-v2', device=device)
+        if device == 'cuda':
+            EMBEDDING_MODEL.half()
+        EMBEDDING_MODEL.max_seq_length = QUERY_MAX_SEQ_LENGTH
+        logger.info(f"Embedding model loaded on {device}")
     return EMBEDDING_MODEL
 
-def get_db_connection():
-    """Create a database connection."""
-    return psycopg2.connect(**DATABASE_CONFIG)
-
 def load_index():
-    """Load the FAISS index from disk."""
+    """Load the FAISS index from disk (memory-mapped, read-only)."""
     global index
     try:
-        index = faiss.read_index(FAISS_INDEX_PATH)
+        # Only the inverted lists touched by a query are paged in, and the
+        # OS can share the pages between processes searching the same file
+        index = faiss.read_index(FAISS_INDEX_PATH, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        set_nprobe(index)
+        index = to_gpu_if_enabled(index)
         logger.info(f"FAISS index loaded from {FAISS_INDEX_PATH}")
         return True
     except Exception as e:
@@ -81,13 +118,24 @@ def load_index():
         return False
 
 def load_url_labels():
-    """Load URL labels from database."""
+    """
+    Load the id -> URL mapping for all indexed (embedded) rows: from the table saved
+    with the index, or from the database when there is none or the index is newer.
+    """
     global url_labels
+    try:
+        if os.path.getmtime(LABELS_PATH) >= os.path.getmtime(FAISS_INDEX_PATH):
+            url_labels = UrlLabels.load(LABELS_PATH)
+            logger.info(f"Loaded {len(url_labels)} URL labels from {LABELS_PATH}")
+            return True
+    except (OSError, ValueError, KeyError) as e:
+        logger.debug(f"No usable URL label file, loading labels from the database: {e}")
     conn = get_db_connection()
     cursor = conn.cursor()
     try:
-        cursor.execute("SELECT url FROM scraped_data ORDER BY id")
-        url_labels = [row[0] for row in cursor.fetchall()]
+        cursor.execute("SELECT id, url FROM scraped_data WHERE embedding IS NOT NULL")
+        rows = cursor.fetchall()
+        url_labels = UrlLabels.from_pairs([row[0] for row in rows], [row[1] for row in rows])
         logger.info(f"Loaded {len(url_labels)} URL labels from database")
         return True
     except Exception as e:
@@ -95,7 +143,7 @@ def load_url_labels():
         return False
     finally:
         cursor.close()
-        conn.close()
+        release_db_connection(conn)
 
 def initialize_search():
     """Initialize search functionality by loading index and URL labels."""
@@ -110,89 +158,333 @@ def reload_index():
     global index, url_labels
     logger.info("Reloading FAISS index and URL labels")
     index = None
-    url_labels = []
+    url_labels = {}
     return initialize_search()
 
-def search(query, amount=10):
+def get_index():
+    """Return the module-level FAISS index, initializing search on first use."""
+    if index is None or not url_labels:
+        if not initialize_search():
+            logger.error("Failed to initialize search")
+            return None
+    return index
+
+def _search_index(index, queries, amount, D=None, I=None):
+    """
+    index.search() on at most SEARCH_OMP_THREADS OpenMP threads. The setting is per
+    thread and ZeroMain also builds the index on the searching thread, so the previous
+    thread count is restored afterwards.
+    """
+    previous = faiss.omp_get_max_threads()
+    faiss.omp_set_num_threads(SEARCH_OMP_THREADS)
+    try:
+        return index.search(queries, amount, D=D, I=I)
+    finally:
+        faiss.omp_set_num_threads(previous)
+
+def search(query, amount=10, q_buf=None, out_dist=None, out_idx=None):
     """
     Search for similar documents using FAISS.
     Args:
         query (str): Search query
         amount (int): Number of results to return
+        q_buf (np.ndarray, optional): Reusable (1, d) float32 buffer for the query embedding
+        out_dist (np.ndarray, optional): Reusable (1, amount) float32 buffer for the distances
+        out_idx (np.ndarray, optional): Reusable (1, amount) int64 buffer for the result ids
     Returns:
         list: List of URLs matching the query
     """
-    global index, url_labels
-    if index is None or not url_labels:
-        if not initialize_search():
-            logger.error("Failed to initialize search")
-            return []
+    index = get_index()
+    if index is None:
+        return []
     # Embed the query using cached model
     model = get_embedding_model()
-    query_embedding = model.encode([query], convert_to_numpy=True).astype('float32')
+    if q_buf is None:
+        query_embedding = model.encode([query], batch_size=1, convert_to_numpy=True,
+                                       normalize_embeddings=True).astype('float32')
+    else:
+        # Copy into the caller's buffer (casting to float32) instead of allocating a new array
+        q_buf[0] = model.encode(query, batch_size=1, convert_to_numpy=True, normalize_embeddings=True)
+        query_embedding = q_buf
     # Search the index
     try:
-        distances, indices = index.search(query_embedding, amount)
-        results = [url_labels[i] for i in indices[0] if i < len(url_labels)]
+        # FAISS writes into out_dist/out_idx when given, otherwise it allocates them
+        distances, indices = _search_index(index, query_embedding, amount, D=out_dist, I=out_idx)
+        # The index returns DB ids (-1 for empty slots)
+        results = url_labels.lookup(indices[0])
         return results
     except Exception as e:
         logger.error(f"Error during search: {e}")
         return []
 
-def get_full_text_for_report(urls):
+def search_batch(queries, amount=10):
+    """
+    Search for several queries with a single embedding pass and FAISS call.
+    Args:
+        queries (list): Search queries
+        amount (int): Number of results to return per query
+    Returns:
+        list: One list of matching URLs per query, in the same order as queries
+    """
+    if not queries:
+        return []
+    index = get_index()
+    if index is None:
+        return [[] for _ in queries]
+    # Embed all queries at once into a (B, d) matrix
+    model = get_embedding_model()
+    query_embeddings = model.encode(list(queries), convert_to_numpy=True,
+                                    normalize_embeddings=True).astype('float32')
+    # Search the index
+    try:
+        distances, indices = _search_index(index, query_embeddings, amount)
+        return [url_labels.lookup(row) for row in indices]
+    except Exception as e:
+        logger.error(f"Error during batch search: {e}")
+        return [[] for _ in queries]
+
+def _fetch_host_pages(urls, crawl_delay):
+    """Fetch the full text of several pages on one host, one after another crawl_delay apart."""
+    pages = []
+    for i, url in enumerate(urls):
+        if i:
+            time.sleep(crawl_delay)
+        pages.append(get_fullpage(url))
+    return pages
+
+def get_full_texts(urls):
     """
     Get full text for URLs, either from DB or by scraping.
+    Stored texts fetched within FULL_TEXT_MAX_AGE are used as they are; older ones
+    are fetched again, falling back to the stored text if that fails.
     Args:
         urls (list): List of URLs to get text for
     Returns:
-        str: Concatenated full texts
+        list: (url, full_text) for every URL with text, in the order of urls
     """
+    ensure_schema() # content_hash/fetched_at may be missing from an older table
     conn = get_db_connection()
     cursor = conn.cursor(cursor_factory=RealDictCursor)
-    full_texts = []
+    texts_by_url = {}
     try:
-        for url in urls:
-            # Check if full text already exists in DB
-            cursor.execute(
-                "SELECT full_text FROM scraped_data WHERE url = %s",
-                (url,)
-            )
-            row = cursor.fetchone()
-            if row and row['full_text']:
-                full_texts.append(row['full_text'])
-                logger.debug(f"Using cached full text for {url}")
-            else:
-                # Scrape full text
-                logger.info(f"Scraping full text for {url}")
-                full_text = get_fullpage(url)
+        # Fetch the already stored full texts in one query
+        cursor.execute(
+            "SELECT url, full_text, crawl_delay, content_hash, "
+            "fetched_at > now() - %s::interval AS fresh "
+            "FROM scraped_data WHERE url = ANY(%s)",
+            (FULL_TEXT_MAX_AGE, list(urls))
+        )
+        rows = cursor.fetchall()
+        texts_by_url = {row['url']: row['full_text'] for row in rows if row['full_text'] and row['fresh']}
+        stale_texts = {row['url']: row['full_text'] for row in rows if row['full_text'] and not row['fresh']}
+        stored_hashes = {row['url']: row['content_hash'] and bytes(row['content_hash']) for row in rows}
+        crawl_delays = {row['url']: row['crawl_delay'] for row in rows}
+        missing = [url for url in urls if url not in texts_by_url]
+        if missing:
+            # Scrape the missing pages concurrently, the fetches are network bound.
+            # Pages on the same host are fetched in sequence, respecting its crawl delay
+            by_host = defaultdict(list)
+            for url in missing:
+                by_host[urlparse(url).netloc].append(url)
+            logger.info(f"Scraping full text for {len(missing)} URLs on {len(by_host)} hosts")
+            fetched = {}
+            with ThreadPoolExecutor(max_workers=min(len(by_host), REPORT_FETCH_WORKERS)) as pool:
+                futures = [
+                    (host_urls, pool.submit(_fetch_host_pages, host_urls,
+                                            max(crawl_delays.get(url) or 1.0 for url in host_urls)))
+                    for host_urls in by_host.values()
+                ]
+                for host_urls, future in futures:
+                    fetched.update(zip(host_urls, future.result()))
+            new_rows = []
+            for url in missing:
+                full_text = fetched[url]
                 if full_text:
-                    # Save to DB
-                    cursor.execute(
-                        "UPDATE scraped_data SET full_text = %s WHERE url = %s",
-                        (full_text, url)
-                    )
-                    conn.commit()
-                    full_texts.append(full_text)
+                    new_hash = hashlib.blake2b(full_text.encode("utf-8"), digest_size=16).digest()
+                    # An unchanged page only gets its fetched_at bumped, the text isn't rewritten
+                    changed = stored_hashes.get(url) != new_hash
+                    new_rows.append((url, full_text if changed else None, new_hash))
+                    texts_by_url[url] = full_text
+                elif url in stale_texts:
+                    logger.warning(f"Failed to refresh full text for {url}, using the stored one")
+                    texts_by_url[url] = stale_texts[url]
                 else:
                     logger.warning(f"Failed to get full text for {url}")
+            if new_rows:
+                # Save them all with a single UPDATE and commit
+                execute_values(
+                    cursor,
+                    "UPDATE scraped_data AS s SET full_text = COALESCE(v.full_text, s.full_text), "
+                    "content_hash = v.content_hash, fetched_at = now() "
+                    "FROM (VALUES %s) AS v(url, full_text, content_hash) WHERE s.url = v.url",
+                    new_rows,
+                    template="(%s, %s::text, %s::bytea)"
+                )
+                conn.commit()
     except Exception as e:
         logger.error(f"Error getting full text: {e}")
     finally:
         cursor.close()
-        conn.close()
-    return "\n\n---\n\n".join(full_texts) # Join with separators
+        release_db_connection(conn)
+    # Keep the search ranking order
+    return [(url, texts_by_url[url]) for url in urls if url in texts_by_url]
 
-def generate_report_with_api(text):
+def get_full_text_for_report(urls):
     """
-    Generate report using OpenRouter API.
+    Get full text for URLs, either from DB or by scraping.
     Args:
-        text (str): Text to generate report from
+        urls (list): List of URLs to get text for
     Returns:
-        str: Generated report
+        str: Concatenated full texts
+    """
+    return REPORT_TEXT_SEPARATOR.join(text for _, text in get_full_texts(urls)) # Join with separators
+
+# --- Map step for reports over long texts ---
+def count_tokens(text):
+    """Number of tokens in text for the report model (estimated unless the local LLM is loaded)."""
+    if not USE_API and LOCAL_LLM is not None:
+        return len(LOCAL_LLM.tokenize(text.encode("utf-8"), add_bos=False))
+    return len(text) // CHARS_PER_TOKEN
+
+def truncate_tokens(text, max_tokens):
+    """Cut text down to about max_tokens tokens of the report model."""
+    if not USE_API and LOCAL_LLM is not None:
+        tokens = LOCAL_LLM.tokenize(text.encode("utf-8"), add_bos=False)
+        if len(tokens) <= max_tokens:
+            return text
+        return LOCAL_LLM.detokenize(tokens[:max_tokens]).decode("utf-8", errors="ignore")
+    return text[:max_tokens * CHARS_PER_TOKEN]
+
+def report_input_budget():
+    """Tokens of page text a report prompt may hold."""
+    if USE_API:
+        return REPORT_MAX_INPUT_TOKENS
+    # The rest of the local context is left for the report itself
+    return min(REPORT_MAX_INPUT_TOKENS, LOCAL_LLM_N_CTX // 2)
+
+def summarize_one(text, max_tokens=SUMMARY_MAX_TOKENS):
+    """
+    Summarize a single page text with the configured model (OpenRouter API or local LLM).
+    Args:
+        text (str): Page text, already cut to fit the model's context
+        max_tokens (int): Length limit of the summary
+    Returns:
+        str: The summary
+    Raises on API/model errors.
+    """
+    prompt = SUMMARY_PROMPT_TEMPLATE.format(text=text)
+    if USE_API:
+        response = API_SESSION.post(
+            "https://openrouter.ai/api/v1/chat/completions",
+            headers={
+                "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+                "Content-Type": "application/json"
+            },
+            json={
+                "model": OPENROUTER_MODEL,
+                "messages": [{"role": "user", "content": prompt}],
+                "max_tokens": max_tokens
+            },
+            timeout=120
+        )
+        response.raise_for_status()
+        return response.json()['choices'][0]['message']['content'].strip()
+    llm = get_local_llm()
+    if llm is None:
+        raise RuntimeError("Local LLM is not available")
+    output = llm(prompt, max_tokens=max_tokens, temperature=0.3, echo=False)
+    return output['choices'][0]['text'].strip()
+
+def summarize_pages(pages, budget):
+    """
+    Summarize (url, full_text) pages so that all summaries together fit in budget tokens.
+    Summaries are stored in scraped_data.summary together with a hash of the text they
+    were made from, so a page is only summarized again once its full text changes.
+    Args:
+        pages (list): (url, full_text) pairs
+        budget (int): Token budget of the final report prompt
+    Returns:
+        list: One summary per page, in the order of pages
+    """
+    # Room for one summary per page, plus some for the prompt and separators
+    max_tokens = max(32, min(SUMMARY_MAX_TOKENS, budget // (len(pages) + 2)))
+    if USE_API:
+        input_tokens = REPORT_MAX_INPUT_TOKENS
+    else:
+        input_tokens = LOCAL_LLM_N_CTX - max_tokens - count_tokens(SUMMARY_PROMPT_TEMPLATE) - 16
+    hashes = [hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest() for _, text in pages]
+
+    summaries = {}
+    ensure_schema() # summary/summary_hash may be missing from an older table
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "SELECT url, summary, summary_hash FROM scraped_data "
+            "WHERE url = ANY(%s) AND summary IS NOT NULL AND summary_hash IS NOT NULL",
+            ([url for url, _ in pages],)
+        )
+        stored = {url: (summary, bytes(summary_hash)) for url, summary, summary_hash in cursor.fetchall()}
+        for (url, _), text_hash in zip(pages, hashes):
+            if url in stored and stored[url][1] == text_hash:
+                summaries[url] = stored[url][0]
+        missing = [(url, text) for url, text in pages if url not in summaries]
+        if missing:
+            logger.info(f"Summarizing {len(missing)} pages for the report")
+            texts = [truncate_tokens(text, input_tokens) for _, text in missing]
+            if USE_API:
+                # API calls are independent requests, so pages are summarized concurrently
+                with ThreadPoolExecutor(max_workers=min(len(missing), REPORT_FETCH_WORKERS)) as pool:
+                    futures = [pool.submit(summarize_one, text, max_tokens) for text in texts]
+                    results = [future.exception() or future.result() for future in futures]
+            else:
+                # One local model instance, one page at a time
+                results = []
+                for text in texts:
+                    try:
+                        results.append(summarize_one(text, max_tokens))
+                    except Exception as e:
+                        results.append(e)
+            new_rows = []
+            hash_by_url = {url: text_hash for (url, _), text_hash in zip(pages, hashes)}
+            for (url, text), result in zip(missing, results):
+                if isinstance(result, Exception) or not result:
+                    # Keep the page in the report, just cut to its share of the prompt
+                    logger.warning(f"Failed to summarize {url}: {result}")
+                    summaries[url] = truncate_tokens(text, max_tokens)
+                else:
+                    summaries[url] = result
+                    new_rows.append((url, result, hash_by_url[url]))
+            if new_rows:
+                execute_values(
+                    cursor,
+                    "UPDATE scraped_data AS s SET summary = v.summary, summary_hash = v.summary_hash "
+                    "FROM (VALUES %s) AS v(url, summary, summary_hash) WHERE s.url = v.url",
+                    new_rows
+                )
+                conn.commit()
+    except Exception as e:
+        logger.error(f"Error summarizing pages: {e}")
+        # Whatever could not be summarized goes in truncated
+        for url, text in pages:
+            summaries.setdefault(url, truncate_tokens(text, max_tokens))
+    finally:
+        cursor.close()
+        release_db_connection(conn)
+    return [summaries[url] for url, _ in pages]
+
+def generate_report_with_api_stream(text):
+    """
+    Generate report using OpenRouter API, streaming it as it is generated.
+    Args:
+        text (str): Text to generate report from
+    Yields:
+        str: Successive pieces of the generated report
     """
     if not OPENROUTER_API_KEY:
         logger.error("OpenRouter API key not configured")
-        return "API key not configured"
+        yield "API key not configured"
+        return
     headers = {
         "Authorization": f"Bearer {OPENROUTER_API_KEY}",
         "Content-Type": "application/json"
@@ -208,40 +500,66 @@ def generate_report_with_api(text):
                 "content": prompt
             }
         ],
-         "max_tokens": 2048 # Adjust as needed
+         "max_tokens": 2048, # Adjust as needed
+         "stream": True # Server-sent events, one per generated chunk
     }
     try:
-        # Ensure the URL is correct (remove trailing space if present in original)
-        response = requests.post(
+        # Closing the generator early closes the connection, which stops the generation
+        with API_SESSION.post(
             "https://openrouter.ai/api/v1/chat/completions",
             headers=headers,
             json=payload,
-            timeout=120
-        )
-        response.raise_for_status()
-        result = response.json()
-        return result['choices'][0]['message']['content']
+            timeout=120,
+            stream=True
+        ) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                # Skip keep-alive comments (": OPENROUTER PROCESSING") and blank separators
+                if not line.startswith(b"data: "):
+                    continue
+                data = line[6:]
+                if data == b"[DONE]":
+                    break
+                chunk = json.loads(data)
+                if "error" in chunk:
+                    raise RuntimeError(chunk["error"].get("message", chunk["error"]))
+                content = chunk["choices"][0].get("delta", {}).get("content")
+                if content:
+                    yield content
     except Exception as e:
         logger.error(f"Error calling OpenRouter API: {e}")
-        return f"Error generating report via API: {str(e)}"
+        yield f"Error generating report via API: {str(e)}"
 
-# --- Modified generate_report_locally function ---
-def generate_report_locally(text):
+def generate_report_with_api(text):
     """
-    Generate report using a local LLM.
+    Generate report using OpenRouter API.
     Args:
         text (str): Text to generate report from
     Returns:
         str: Generated report
     """
+    return "".join(generate_report_with_api_stream(text))
+
+# --- Modified generate_report_locally function ---
+def generate_report_locally_stream(text):
+    """
+    Generate report using a local LLM, streaming it token by token.
+    Args:
+        text (str): Text to generate report from
+    Yields:
+        str: Successive pieces of the generated report
+    """
     if not USE_LOCAL_LLM:
-        return "Local LLM usage is disabled in config."
+        yield "Local LLM usage is disabled in config."
+        return
     if not LOCAL_LLM_AVAILABLE:
-         return "Local LLM library (e.g., llama-cpp-python) is not installed."
+        yield "Local LLM library (e.g., llama-cpp-python) is not installed."
+        return
 
     llm = get_local_llm()
     if llm is None:
-        return "Failed to load local LLM. Check logs and configuration."
+        yield "Failed to load local LLM. Check logs and configuration."
+        return
 
     try:
         # Use the prompt template from config if available, otherwise default
@@ -256,38 +574,72 @@ def generate_report_locally(text):
             temperature=0.7,
             top_p=0.9,
             echo=False,
-            stop=[] # Add stop sequences if needed
+            stop=[], # Add stop sequences if needed
+            stream=True # Yields completion chunks; closing the generator stops decoding
         )
-        report_text = output['choices'][0]['text']
+        for chunk in output:
+            yield chunk['choices'][0]['text']
         logger.info("Local LLM report generation completed.")
-        return report_text.strip() # Return the generated text, stripped of leading/trailing whitespace
 
     except Exception as e:
         error_msg = f"Error generating report with local LLM: {e}"
         logger.error(error_msg, exc_info=True) # Log the full traceback
-        return error_msg
+        yield error_msg
 
-def report(urls):
+def generate_report_locally(text):
     """
-    Generate a comprehensive report from a list of URLs.
+    Generate report using a local LLM.
     Args:
-        urls (list): List of URLs to generate report from
+        text (str): Text to generate report from
     Returns:
         str: Generated report
     """
+    # Stripped of leading/trailing whitespace
+    return "".join(generate_report_locally_stream(text)).strip()
+
+def report_stream(urls):
+    """
+    Generate a comprehensive report from a list of URLs, yielding it piece by piece
+    as the model generates it.
+    Args:
+        urls (list): List of URLs to generate report from
+    Yields:
+        str: Successive pieces of the generated report
+    """
     if not urls:
-        return "No URLs provided for report generation"
+        yield "No URLs provided for report generation"
+        return
     # Get full text for all URLs
-    full_text = get_full_text_for_report(urls)
-    if not full_text:
-        return "Failed to retrieve content for report generation"
+    pages = get_full_texts(urls)
+    if not pages:
+        yield "Failed to retrieve content for report generation"
+        return
+    full_text = REPORT_TEXT_SEPARATOR.join(text for _, text in pages)
+    if not USE_API:
+        get_local_llm() # Loaded up front so its tokenizer does the counting
+    budget = report_input_budget()
+    model_ready = OPENROUTER_API_KEY if USE_API else USE_LOCAL_LLM and LOCAL_LLM_AVAILABLE
+    if model_ready and count_tokens(full_text) > budget:
+        # Too long for one prompt: summarize each page (map), then report on the summaries (reduce)
+        logger.info(f"Page texts exceed {budget} tokens, summarizing {len(pages)} pages first")
+        full_text = REPORT_TEXT_SEPARATOR.join(summarize_pages(pages, budget))
     # Generate report based on configuration
     if USE_API:
         logger.info("Generating report using OpenRouter API")
-        return generate_report_with_api(full_text)
+        yield from generate_report_with_api_stream(full_text)
     else:
         logger.info("Generating report using local model")
-        return generate_report_locally(full_text)
+        yield from generate_report_locally_stream(full_text)
+
+def report(urls):
+    """
+    Generate a comprehensive report from a list of URLs.
+    Args:
+        urls (list): List of URLs to generate report from
+    Returns:
+        str: Generated report
+    """
+    return "".join(report_stream(urls))
 
 # Initialize on module load (optional logging)
 logger.info("ZeroSearch++ module loaded")
@@ -5,16 +5,18 @@ import threading
 import multiprocessing as mp
 from multiprocessing import Event
 from queue import Queue
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import psycopg2
 from psycopg2.extras import RealDictCursor
 # Import SCHEMA_NAME if defined in config.py, otherwise use 'zeroweb'
 try:
-    from config import DATABASE_CONFIG, SCRAPING_THREADS_PER_PROCESS, MAX_SCRAPING_PROCESSES, SCHEMA_NAME
+    from config import SCRAPING_THREADS_PER_PROCESS, MAX_SCRAPING_PROCESSES, SCHEMA_NAME
 except ImportError:
-    from config import DATABASE_CONFIG, SCRAPING_THREADS_PER_PROCESS, MAX_SCRAPING_PROCESSES
+    from config import SCRAPING_THREADS_PER_PROCESS, MAX_SCRAPING_PROCESSES
     SCHEMA_NAME = "zeroweb" # Default schema name if not in config
 
 from ZeroScraper import get_snippet, get_URL_list
+from ZeroDB import get_db_connection, release_db_connection, MIGRATE_SCRAPED_DATA
 import signal
 import sys
 import logging
@@ -23,6 +25,9 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Domains whose URL lists (robots.txt + Common Crawl pages) are fetched at the same time
+URL_DISCOVERY_WORKERS = 8
+
 # Global control flag for graceful shutdown
 shutdown_event = Event()
 
@@ -38,7 +43,7 @@ def initDB(db_path=None): # db_path is unused based on current implementation, k
     conn = None
     cursor = None
     try:
-        conn = psycopg2.connect(**DATABASE_CONFIG)
+        conn = get_db_connection()
         cursor = conn.cursor()
         # Ensure the schema exists
         cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {SCHEMA_NAME};")
@@ -51,12 +56,18 @@ def initDB(db_path=None): # db_path is unused based on current implementation, k
             id SERIAL PRIMARY KEY,
             url TEXT UNIQUE NOT NULL,
             snippet TEXT,
-            embedding BYTEA, -- Stores pickled numpy array
+            embedding BYTEA, -- Stores the float32 vector as raw little-endian bytes
             crawl_delay REAL DEFAULT 1.0,
-            full_text TEXT
+            full_text TEXT,
+            content_hash BYTEA, -- BLAKE2b-128 of full_text
+            fetched_at TIMESTAMPTZ, -- When full_text was last fetched
+            summary TEXT, -- Report summary of full_text
+            summary_hash BYTEA -- BLAKE2b-128 of the full_text the summary was made from
         );
         """
         cursor.execute(create_table_query)
+        # Tables created by older versions
+        cursor.execute(MIGRATE_SCRAPED_DATA)
         conn.commit()
         logger.info(f"Database table 'scraped_data' initialized within schema '{SCHEMA_NAME}'.")
     except psycopg2.Error as e:
@@ -70,7 +81,7 @@ def initDB(db_path=None): # db_path is unused based on current implementation, k
         if cursor:
             cursor.close()
         if conn:
-            conn.close()
+            release_db_connection(conn)
 
 
 # --- Modify insert_urls_into_db to return the count of inserted/total URLs ---
@@ -84,24 +95,35 @@ def insert_urls_into_db(domains):
     cursor = None
     total_urls = 0
     try:
-        conn = psycopg2.connect(**DATABASE_CONFIG)
+        conn = get_db_connection()
         cursor = conn.cursor()
         cursor.execute(f"SET LOCAL search_path TO {SCHEMA_NAME};")
-        for domain in domains:
-            logger.info(f"Fetching URLs for domain: {domain}")
-            urls, delay = get_URL_list(domain)
-            total_urls += len(urls) # Increment total attempted URLs
-            for url in urls:
+        # URL discovery is network bound, so domains are fetched concurrently and a
+        # slow domain no longer holds up the others; inserts stay on this thread
+        with ThreadPoolExecutor(max_workers=max(1, min(len(domains), URL_DISCOVERY_WORKERS))) as pool:
+            futures = {}
+            for domain in domains:
+                logger.info(f"Fetching URLs for domain: {domain}")
+                futures[pool.submit(get_URL_list, domain)] = domain
+            for future in as_completed(futures):
+                domain = futures[future]
                 try:
-                    cursor.execute(
-                        "INSERT INTO scraped_data (url, crawl_delay) VALUES (%s, %s) ON CONFLICT (url) DO NOTHING",
-                        (url, delay)
-                    )
-                except psycopg2.Error as e:
-                    logger.error(f"Database error inserting URL {url}: {e}")
+                    urls, delay = future.result()
                 except Exception as e:
-                    logger.error(f"Error processing URL {url} from {domain}: {e}")
-            conn.commit()
+                    logger.error(f"Error fetching URLs for domain {domain}: {e}")
+                    continue
+                total_urls += len(urls) # Increment total attempted URLs
+                for url in urls:
+                    try:
+                        cursor.execute(
+                            "INSERT INTO scraped_data (url, crawl_delay) VALUES (%s, %s) ON CONFLICT (url) DO NOTHING",
+                            (url, delay)
+                        )
+                    except psycopg2.Error as e:
+                        logger.error(f"Database error inserting URL {url}: {e}")
+                    except Exception as e:
+                        logger.error(f"Error processing URL {url} from {domain}: {e}")
+                conn.commit()
     except psycopg2.Error as e:
         error_msg = f"Database error in insert_urls_into_db: {e}"
         logger.error(error_msg)
@@ -115,7 +137,7 @@ def insert_urls_into_db(domains):
         if cursor:
             cursor.close()
         if conn:
-            conn.close()
+            release_db_connection(conn)
     logger.info(f"All URLs insertion attempt completed. Total URLs attempted: {total_urls}")
     return total_urls # Return the total count
 
@@ -130,7 +152,7 @@ def get_unscraped_rows(batch_size=1000):
     cursor = None
     rows = []
     try:
-        conn = psycopg2.connect(**DATABASE_CONFIG)
+        conn = get_db_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         cursor.execute(f"SET LOCAL search_path TO {SCHEMA_NAME};")
 
@@ -162,10 +184,8 @@ def get_unscraped_rows(batch_size=1000):
     finally:
         if cursor:
             cursor.close()
-        # Don't close conn here if you plan to reuse it within the same process/thread context
-        # For this function returning a list, closing is appropriate.
         if conn:
-            conn.close()
+            release_db_connection(conn)
     return rows
 
 
@@ -177,7 +197,7 @@ def update_snippet_in_db(row_id, snippet):
     conn = None
     cursor = None
     try:
-        conn = psycopg2.connect(**DATABASE_CONFIG)
+        conn = get_db_connection()
         cursor = conn.cursor()
         cursor.execute(f"SET LOCAL search_path TO {SCHEMA_NAME};")
 
@@ -205,47 +225,59 @@ def update_snippet_in_db(row_id, snippet):
         if cursor:
             cursor.close()
         if conn:
-            conn.close()
+            release_db_connection(conn)
 
 
 
-def scrape_worker(url_queue, progress_lock, processed_count):
+def scrape_row(row, progress_lock, processed_count, output_queue=None):
     """
-    Worker thread function that scrapes snippets.
+    Scrapes the snippet for a single row and stores it.
     Reports progress via shared variables and a callback.
+    The stored (row_id, snippet) is also put on output_queue, if given, for embedding.
+    """
+    if shutdown_event.is_set():
+        return
+    url = row['url']
+    row_id = row['id']
+    delay = row.get('crawl_delay', 1.0)
+    success = False
+    try:
+        _, snippet = get_snippet(url)
+        update_snippet_in_db(row_id, snippet)
+        if output_queue is not None and snippet:
+            output_queue.put((row_id, snippet))
+        logger.debug(f"Scraped snippet for {url}")
+        success = True
+    except Exception as e:
+        logger.error(f"Error scraping {url}: {e}")
+    finally:
+        # Always update progress
+        with progress_lock:
+            processed_count.value += 1
+            current_count = processed_count.value
+        # Call the progress callback if set
+        if progress_callback:
+            try:
+                # Pass the current count and a flag indicating success if needed
+                progress_callback(current_count, success)
+            except Exception as e:
+                logger.error(f"Error calling progress callback: {e}")
+
+        time.sleep(delay) # Respect crawl delay
+
+def scrape_worker(url_queue, progress_lock, processed_count, output_queue=None):
+    """
+    Worker thread function that scrapes snippets from url_queue until shutdown.
     """
-    global progress_callback # Access the global callback
     while not shutdown_event.is_set():
         try:
             row = url_queue.get(timeout=1)
         except:
             continue
-        url = row['url']
-        row_id = row['id']
-        delay = row.get('crawl_delay', 1.0)
-        success = False
         try:
-            _, snippet = get_snippet(url)
-            update_snippet_in_db(row_id, snippet)
-            logger.debug(f"Scraped snippet for {url}")
-            success = True
-        except Exception as e:
-            logger.error(f"Error scraping {url}: {e}")
+            scrape_row(row, progress_lock, processed_count, output_queue)
         finally:
-            # Always mark task as done and update progress
             url_queue.task_done()
-            with progress_lock:
-                processed_count.value += 1
-                current_count = processed_count.value
-            # Call the progress callback if set
-            if progress_callback:
-                try:
-                    # Pass the current count and a flag indicating success if needed
-                    progress_callback(current_count, success)
-                except Exception as e:
-                    logger.error(f"Error calling progress callback: {e}")
-
-            time.sleep(delay) # Respect crawl delay
 
 
 
@@ -284,60 +316,52 @@ def start_scraping_process(rows):
     return process
 
 # --- Modify continuous_scraping_worker to accept and use shared state for progress ---
-def continuous_scraping_worker(progress_lock, processed_count):
+def continuous_scraping_worker(progress_lock, processed_count, output_queue=None):
     """
     Worker function that continuously fetches batches and processes them.
     This replaces the static batch approach for better dynamic load balancing.
     Uses shared state for progress tracking.
     """
-    global progress_callback # Access the global callback
-    while not shutdown_event.is_set():
-        rows = get_unscraped_rows(batch_size=100)
-        if not rows:
-            logger.info("No more unscraped rows found. Waiting before retry...")
-            time.sleep(5)
-            continue
-        logger.info(f"Processing batch of {len(rows)} URLs")
-        url_queue = Queue()
-        for row in rows:
-            url_queue.put(row)
-
-        # --- Use threading instead of multiprocessing for threads within a process ---
-        # --- Share the lock and counter with threads ---
-        threads = []
-        # Number of threads is defined in config
-        num_threads = SCRAPING_THREADS_PER_PROCESS
-        for _ in range(num_threads):
-            t = threading.Thread(target=scrape_worker, args=(url_queue, progress_lock, processed_count))
-            t.start()
-            threads.append(t)
-
-        try:
-            url_queue.join() # Wait for all tasks in the queue to be processed
-        except KeyboardInterrupt:
-            shutdown_event.set()
-
-        # Join threads
-        for t in threads:
-            t.join()
-
-        if shutdown_event.is_set():
-            break
-
-def start_scraping_process_continuous(progress_lock, processed_count):
+    # One pool of scraping threads per process, reused for every batch.
+    # Number of threads is defined in config
+    with ThreadPoolExecutor(max_workers=SCRAPING_THREADS_PER_PROCESS) as pool:
+        while not shutdown_event.is_set():
+            rows = get_unscraped_rows(batch_size=100)
+            if not rows:
+                logger.info("No more unscraped rows found. Waiting before retry...")
+                time.sleep(5)
+                continue
+            logger.info(f"Processing batch of {len(rows)} URLs")
+
+            # --- Share the lock and counter with the pool threads ---
+            try:
+                # Consuming the results waits for the whole batch (and re-raises worker errors)
+                for _ in pool.map(lambda row: scrape_row(row, progress_lock, processed_count,
+                                                         output_queue), rows):
+                    pass
+            except KeyboardInterrupt:
+                shutdown_event.set()
+
+            if shutdown_event.is_set():
+                break
+
+def start_scraping_process_continuous(progress_lock, processed_count, output_queue=None):
     """
     Starts a process that continuously fetches and processes batches.
     Passes shared state for progress tracking.
     """
     # Pass the shared lock and counter to the worker function
-    process = mp.Process(target=continuous_scraping_worker, args=(progress_lock, processed_count))
+    process = mp.Process(target=continuous_scraping_worker,
+                         args=(progress_lock, processed_count, output_queue))
     process.start()
     return process
 
-def start_scraping(domains, progress_cb=None):
+def start_scraping(domains, progress_cb=None, output_queue=None):
     """
     Main scraping orchestrator using continuous batch processing.
     Accepts a progress callback function: progress_cb(current_count, success_flag).
+    If output_queue (a multiprocessing.Queue) is given, every scraped (row_id, snippet)
+    is put on it as soon as it is stored, so the caller can embed while scraping continues.
     """
     global progress_callback
     logger.info("Starting scraping process...")
@@ -354,7 +378,7 @@ def start_scraping(domains, progress_cb=None):
     processes = []
     for _ in range(MAX_SCRAPING_PROCESSES):
         # Pass the shared lock and counter to the process starter
-        p = start_scraping_process_continuous(progress_lock, processed_count)
+        p = start_scraping_process_continuous(progress_lock, processed_count, output_queue)
         processes.append(p)
         time.sleep(0.1)
 
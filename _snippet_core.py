@@ -0,0 +1,42 @@
+# _snippet_core.py
+#
+# Snippet text processing for ZeroScraper.get_snippet(), which runs once per scraped page.
+# Fully typed and import-free so it can be compiled to a C extension with mypyc
+# (from requirements-dev.txt):
+#     mypyc _snippet_core.py
+# Python then imports the compiled module instead of this file; without it this file is used as is.
+
+from typing import Final
+
+# Characters of visible page text used when a page has no meta description
+SNIPPET_TEXT_CHARS: Final = 200
+
+def collapse_whitespace(text: str, limit: int) -> str:
+    """
+    First limit characters of ' '.join(text.split()), scanning only as much of
+    text as needed instead of splitting the whole document.
+    """
+    parts: list[str] = []
+    length = 0
+    space = False
+    for ch in text:
+        if ch.isspace():
+            space = length > 0
+            continue
+        if space:
+            parts.append(' ')
+            length += 1
+            space = False
+            if length >= limit:
+                break
+        parts.append(ch)
+        length += 1
+        if length >= limit:
+            break
+    return ''.join(parts)
+
+def build_snippet(title: str, description: str, text: str) -> str:
+    """Snippet stored for a page: the title over the description, or over the start of text without one."""
+    if not description:
+        description = collapse_whitespace(text, SNIPPET_TEXT_CHARS)
+    return f"{title}\n{description}"
@@ -5,6 +5,14 @@ USE_LOCAL_LLM = False
 LOCAL_LLM_MODEL_PATH = "input path to your model here."
 LOCAL_LLM_N_CTX = 2048
 LOCAL_LLM_N_THREADS = 8
+# Layers offloaded to the GPU (CUDA, Metal, ROCm, Vulkan builds); -1 = all, 0 = CPU only.
+# CPU-only builds of llama-cpp-python ignore it
+LOCAL_LLM_N_GPU_LAYERS = -1
+# Prompt for AI reports (local model and API); {text} is replaced by the fetched page texts
+LOCAL_LLM_PROMPT_TEMPLATE = "Compile the following information into a comprehensive report:\n{text}"
+# Page texts longer than this (in tokens, in total) are summarized page by page first
+# and the report is written from the summaries (the local LLM is also capped at half its n_ctx)
+REPORT_MAX_INPUT_TOKENS = 8000
 
 THREAD_AMOUNT_PER_CORE = 30
 CORE_AMOUNT = 4
@@ -14,8 +22,9 @@ COMMON_CRAWL_INDEX_NAME = "CC-MAIN-2024-26"  # Update to current Common Crawl in
 MAX_URLS_PER_DOMAIN = 1000  # I recommend increasing
 
 # Database configuration (PostgreSQL DB) look in for a guide on Youtube
+SCHEMA_NAME = "zeroweb"
 DATABASE_CONFIG = {
-    options = f"-c search_path={SCHEMA_NAME}"
+    'options': f"-c search_path={SCHEMA_NAME}",
     'dbname': 'your_database_name',
     'user': 'your_database_user',
     'password': 'your_password',
@@ -34,7 +43,14 @@ MAX_SCRAPING_PROCESSES = CORE_AMOUNT
 # go read documentation if you think your a nerd.
 
 FAISS_INDEX_PATH = 'zeroweb_index.faiss'
+# Search on the GPU(s) when a GPU build of faiss (faiss-gpu) finds a CUDA device
+USE_GPU_FAISS = False
+# {nlist} is filled in from the corpus size (about 4*sqrt(N)) unless 'nlist' is set.
+# Up to 'flat_max' vectors an exact flat index is used instead.
 FAISS_INDEX_CONFIG = {
-    'factory': 'IVF4096,PQ32x8',
-    'nprobe': 8
+    'factory': 'OPQ32,IVF{nlist},PQ32',
+    'nlist': None,
+    'nprobe': 16,
+    'flat_max': 10000,
+    'train_sample': 100000
 }
\ No newline at end of file